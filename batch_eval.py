@@ -0,0 +1,269 @@
+"""Headless batch evaluation of the Carney persona across models.
+
+Sends every question in a JSONL or CSV file to one or more models with the same system
+prompt, reference notes and request parameters as the app, and appends one JSON line
+per answer to a results file:
+
+    python batch_eval.py questions.jsonl --model llama-3.3-70b-versatile --model gemma-2-27b-it
+    python batch_eval.py questions.csv --model all --rpm 30 --tpm 6000 --out results.jsonl
+
+Questions are JSON objects with a "question" field, or CSV rows with a "question"
+column; an optional "id" names each one. Rerunning with the same results file skips
+answers already written, so an interrupted run picks up where it stopped. Requests are
+paced to the given per-minute limits and retried with jittered backoff on rate limits
+and server errors. Point --base-url at mock_groq.py to try it offline.
+"""
+import argparse
+import csv
+import json
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import retrieval
+from persona import (
+    DEFAULT_MODEL_INDEX, DEFAULT_MAX_TOKENS, DEFAULT_TEMPERATURE, RETRIEVAL_TOP_K,
+    _get_system_prompt, models, estimate_tokens, build_context, format_reference_notes,
+)
+
+RETRY_BASE_SECONDS = 1.0
+RETRY_MAX_SECONDS = 30.0
+READ_TIMEOUT = 120.0
+
+
+class RatePacer:
+    """Spaces requests out so a minute never holds more than the allowed requests or tokens."""
+
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int, stop: threading.Event = None):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.stop = stop or threading.Event()
+        self._sent = deque()  # (sent_at, tokens) in the last minute
+        self._lock = threading.Lock()
+
+    def wait(self, tokens: int) -> bool:
+        """Blocks until a request of this size may go; returns False if the run is stopping."""
+        while not self.stop.is_set():
+            with self._lock:
+                now = time.monotonic()
+                while self._sent and now - self._sent[0][0] >= 60.0:
+                    self._sent.popleft()
+                used = sum(sent_tokens for _, sent_tokens in self._sent)
+                if not self._sent or (
+                    (not self.requests_per_minute or len(self._sent) < self.requests_per_minute)
+                    and (not self.tokens_per_minute or used + tokens <= self.tokens_per_minute)
+                ):
+                    self._sent.append((now, tokens))
+                    return True
+                delay = 60.0 - (now - self._sent[0][0])  # Until the oldest request leaves the window
+            self.stop.wait(min(max(delay, 0.01), 1.0))
+        return False
+
+
+def read_questions(path: str) -> list:
+    """Reads (id, question) pairs from a JSONL or CSV file."""
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.lower().endswith(".csv"):
+            rows = list(csv.DictReader(f))
+        else:
+            rows = [json.loads(line) for line in f if line.strip()]
+    questions = []
+    for number, row in enumerate(rows, 1):
+        question = (row.get("question") or "").strip()
+        if question:
+            questions.append((str(row.get("id") or number), question))
+    return questions
+
+
+def read_done(path: str) -> set:
+    """Returns the (id, model) pairs already answered without error in a results file."""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # A line cut short by an interruption
+            if not result.get("error"):
+                done.add((result["id"], result["model"]))
+    return done
+
+
+def build_request(model: str, question: str, notes: str, max_tokens: int):
+    """Builds the messages and reply budget the app would send for a first question."""
+    messages = [{"role": "system", "content": _get_system_prompt()}, {"role": "user", "content": question}]
+    token_counts = [estimate_tokens(m["content"]) for m in messages]
+    return build_context(messages, token_counts, models[model]["tokens"], max_tokens, notes)
+
+
+def retry_delay(error, attempt: int) -> float:
+    """Honours a retry-after header when there is one, else backs off with full jitter."""
+    response = getattr(error, "response", None)
+    if response is not None:
+        try:
+            return min(float(response.headers.get("retry-after", "")), RETRY_MAX_SECONDS)
+        except ValueError:
+            pass
+    return random.uniform(0, min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** attempt))
+
+
+def is_retryable(error) -> bool:
+    from groq import APIConnectionError, APIStatusError
+    if isinstance(error, APIStatusError):
+        return error.status_code == 429 or error.status_code >= 500
+    return isinstance(error, APIConnectionError)
+
+
+def ask(client, pacer: RatePacer, question_id: str, question: str, model: str, notes: str, args, stop: threading.Event):
+    """Answers one question with one model, retrying transient failures.
+
+    Returns None, without sending anything more, once stop is set.
+    """
+    context, reply_tokens = build_request(model, question, notes, args.max_tokens)
+    estimate = sum(estimate_tokens(m["content"]) for m in context) + reply_tokens
+    result = {"id": question_id, "model": model, "question": question}
+    started = time.perf_counter()
+    for attempt in range(args.retries + 1):
+        if stop.is_set() or not pacer.wait(estimate):
+            return None
+        request_started = time.perf_counter()
+        try:
+            completion = client.chat.completions.create(
+                model=model,
+                messages=context,
+                max_tokens=reply_tokens,
+                temperature=args.temperature,
+            )
+        except Exception as e:
+            if attempt < args.retries and is_retryable(e):
+                stop.wait(retry_delay(e, attempt))
+                continue
+            result.update(error=f"{type(e).__name__}: {e}", attempts=attempt + 1,
+                          total_seconds=round(time.perf_counter() - started, 4))
+            return result
+        usage = completion.usage
+        result.update(
+            answer=completion.choices[0].message.content,
+            prompt_tokens=usage.prompt_tokens if usage else None,
+            completion_tokens=usage.completion_tokens if usage else None,
+            total_tokens=usage.total_tokens if usage else None,
+            latency_seconds=round(time.perf_counter() - request_started, 4),
+            total_seconds=round(time.perf_counter() - started, 4),  # Including pacing and retries
+            attempts=attempt + 1,
+            error=None,
+        )
+        return result
+
+
+def make_client(args):
+    from groq import DefaultHttpxClient, Groq
+    import httpx
+
+    api_key = args.api_key or os.environ.get("GROQ_API_KEY")
+    if not api_key:
+        sys.exit("Set GROQ_API_KEY or pass --api-key (any value will do against mock_groq.py)")
+    return Groq(
+        api_key=api_key,
+        base_url=args.base_url,
+        max_retries=0,  # Retries are paced here instead
+        timeout=httpx.Timeout(READ_TIMEOUT, connect=5.0),
+        http_client=DefaultHttpxClient(limits=httpx.Limits(max_connections=args.workers, max_keepalive_connections=args.workers)),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("questions", help="JSONL or CSV file of questions")
+    parser.add_argument("--model", action="append", default=[], help="Model id to ask, repeatable, or 'all'")
+    parser.add_argument("--out", default="eval_results.jsonl", help="Results file; existing answers are skipped")
+    parser.add_argument("--workers", type=int, default=8, help="Requests in flight at once")
+    parser.add_argument("--rpm", type=int, default=30, help="Requests per minute to stay under; 0 for no limit")
+    parser.add_argument("--tpm", type=int, default=0, help="Tokens per minute to stay under; 0 for no limit")
+    parser.add_argument("--retries", type=int, default=4, help="Retries per request on rate limits and server errors")
+    parser.add_argument("--max-tokens", type=int, default=DEFAULT_MAX_TOKENS)
+    parser.add_argument("--temperature", type=float, default=DEFAULT_TEMPERATURE)
+    parser.add_argument("--no-retrieval", action="store_true", help="Leave out the reference notes from corpus/")
+    parser.add_argument("--base-url", default=os.environ.get("GROQ_BASE_URL"), help="API base URL, e.g. a mock_groq.py server")
+    parser.add_argument("--api-key", help="Defaults to GROQ_API_KEY")
+    args = parser.parse_args()
+
+    model_ids = list(models) if "all" in args.model else args.model or [list(models)[DEFAULT_MODEL_INDEX]]
+    unknown = [model for model in model_ids if model not in models]
+    if unknown:
+        parser.error(f"Unknown model(s): {', '.join(unknown)}. Choose from: {', '.join(models)}")
+
+    questions = read_questions(args.questions)
+    done = read_done(args.out)
+    jobs = [(qid, question, model) for qid, question in questions for model in model_ids if (qid, model) not in done]
+    print(f"{len(questions)} questions x {len(model_ids)} models: {len(jobs)} to run, {len(done)} already done")
+    if not jobs:
+        return
+
+    index = None if args.no_retrieval else retrieval.load_index()
+    if index is None and not args.no_retrieval:
+        print(f"No corpus files in {retrieval.CORPUS_DIR}; asking without reference notes", file=sys.stderr)
+    notes = {}
+    for _, question in questions:
+        if question not in notes:
+            notes[question] = format_reference_notes(index.search(question, RETRIEVAL_TOP_K)) if index else ""
+
+    client = make_client(args)
+    stop = threading.Event()
+    pacer = RatePacer(args.rpm, args.tpm, stop)
+    results = []
+    started = time.perf_counter()
+    pool = ThreadPoolExecutor(max_workers=args.workers)
+    with open(args.out, "a", encoding="utf-8") as out:
+        def record(result):
+            results.append(result)
+            out.write(json.dumps(result) + "\n")
+            out.flush()  # Each answer survives an interruption
+            status = result["error"] or f"{result['latency_seconds']:.2f}s"
+            print(f"[{len(results)}/{len(jobs)}] {result['model']} #{result['id']}: {status}", flush=True)
+
+        pending = set()
+        queued = iter(jobs)
+        try:
+            while True:
+                # Keep a bounded window of work queued rather than submitting every job up front
+                for qid, question, model in queued:
+                    pending.add(pool.submit(ask, client, pacer, qid, question, model, notes[question], args, stop))
+                    if len(pending) >= args.workers * 2:
+                        break
+                if not pending:
+                    break
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    record(future.result())
+        except KeyboardInterrupt:
+            print("Interrupted; finishing the requests already sent...", flush=True)
+            # Workers pacing or backing off give up without sending; queued jobs never start
+            stop.set()
+            pool.shutdown(wait=True, cancel_futures=True)
+            for future in pending:
+                if not future.cancelled() and future.exception() is None and future.result() is not None:
+                    record(future.result())
+            print("Rerun the same command to resume.")
+            raise SystemExit(130)
+        finally:
+            pool.shutdown(wait=False)
+    wall = time.perf_counter() - started
+
+    answered = [result for result in results if not result["error"]]
+    latencies = sorted(result["latency_seconds"] for result in answered)
+    print(f"{len(answered)} answered, {len(results) - len(answered)} failed in {wall:.1f}s "
+          f"({len(results) / wall * 60:.1f} requests/min)")
+    if latencies:
+        print(f"latency p50 {statistics.median(latencies):.2f}s, "
+              f"p95 {latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))]:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
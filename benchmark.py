@@ -0,0 +1,204 @@
+"""Offline load test for streamlit_app.py against the local mock Groq server.
+
+Drives simulated visitor sessions through the real script with Streamlit's AppTest and
+reports cold start time, turn latency percentiles, CPU time per rerun and memory per
+session:
+
+    python benchmark.py --sessions 20 --turns 3
+    python benchmark.py --render-interval 0 --render-chars 0   # redraw on every token
+
+The mock server runs in a child process so its CPU time is not charged to the app, and
+cold start is timed in a freshly spawned interpreter that has imported nothing yet.
+AppTest is not thread-safe, so concurrent sessions are spread over worker processes.
+Conversations and cached replies are written to a temporary directory, not the app's .cache.
+"""
+import argparse
+import gc
+import json
+import multiprocessing
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+APP_PATH = os.path.join(ROOT, "streamlit_app.py")
+MOCK_PATH = os.path.join(ROOT, "mock_groq.py")
+
+QUESTIONS = [
+    "Pray, tell me of thy days afore the war.",
+    "What befell at the storming of Fort Wagner?",
+    "How didst thou bear the colors in battle?",
+    "What trials did the 54th Massachusetts endure?",
+    "Where didst thou live after the war?",
+]
+
+
+def start_mock_server(args):
+    """Launches mock_groq.py on a free port and returns the process and its URL."""
+    process = subprocess.Popen(
+        [sys.executable, MOCK_PATH, "--port", "0", "--token-rate", str(args.token_rate),
+         "--latency", str(args.latency), "--error-rate", str(args.error_rate),
+         "--reply-tokens", str(args.reply_tokens), "--seed", "0"],
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    url = process.stdout.readline().rsplit(" ", 1)[-1].strip()
+    return process, url
+
+
+def rss_bytes() -> int:
+    """Returns the resident set size of this process."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024  # Peak, not current, on this fallback
+
+
+def percentile(values, fraction: float):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def run_session(index: int, turns: int, timeout: float):
+    """Runs one visitor session and returns it with its per-turn latencies and error count."""
+    from streamlit.testing.v1 import AppTest
+
+    app = AppTest.from_file(APP_PATH, default_timeout=timeout)
+    app.secrets["GROQ_API_KEY"] = "benchmark"
+    app.run()
+    app.button(key="dismiss_welcome").click().run()
+    latencies = []
+    errors = 0
+    for turn in range(turns):
+        question = QUESTIONS[(index + turn) % len(QUESTIONS)]
+        started = time.perf_counter()
+        app.chat_input[0].set_value(question).run()
+        latencies.append(time.perf_counter() - started)
+        errors += len(app.error) + len(app.exception)
+    return app, latencies, errors
+
+
+def measure_startup(timeout: float) -> dict:
+    """Times the first page drawn by a cold server process."""
+    started = time.perf_counter()
+    from streamlit.testing.v1 import AppTest
+    framework_ready = time.perf_counter()
+    rss_before = rss_bytes()
+    app = AppTest.from_file(APP_PATH, default_timeout=timeout)
+    app.secrets["GROQ_API_KEY"] = "benchmark"
+    app.run()
+    first_page = time.perf_counter()
+    return {
+        "streamlit_import_seconds": framework_ready - started,
+        "first_page_seconds": first_page - framework_ready,
+        "first_page_rss_growth": rss_bytes() - rss_before,
+    }
+
+
+def run_worker(session_indexes, turns: int, timeout: float) -> dict:
+    """Runs a share of the sessions in this process, keeping them alive to measure memory."""
+    # Warm imports and process-wide resources so they are not charged to the first session
+    run_session(0, 1, timeout)
+    gc.collect()
+    rss_before = rss_bytes()
+    cpu_before = time.process_time()
+    sessions = [run_session(index, turns, timeout) for index in session_indexes]
+    cpu = time.process_time() - cpu_before
+    gc.collect()
+    return {
+        "latencies": [latency for _, latencies, _ in sessions for latency in latencies],
+        "errors": sum(errors for _, _, errors in sessions),
+        "cpu_seconds": cpu,
+        "rss_growth": rss_bytes() - rss_before,  # Sessions are still referenced here
+        "sessions": len(sessions),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=10)
+    parser.add_argument("--turns", type=int, default=3, help="Questions asked per session")
+    parser.add_argument("--concurrency", type=int, default=1, help="Sessions driven at once")
+    parser.add_argument("--token-rate", type=float, default=0.0, help="Mock tokens per second; 0 streams without delay")
+    parser.add_argument("--latency", type=float, default=0.0, help="Mock seconds before each response")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--reply-tokens", type=int, default=300)
+    parser.add_argument("--render-interval", type=float, default=None, help="Override RENDER_FLUSH_INTERVAL")
+    parser.add_argument("--render-chars", type=int, default=None, help="Override RENDER_FLUSH_CHARS")
+    parser.add_argument("--rpm", type=int, default=100000, help="Admission requests per minute")
+    parser.add_argument("--tpm", type=int, default=100000000, help="Admission tokens per minute")
+    parser.add_argument("--cache", action="store_true", help="Leave the response cache on")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Seconds allowed per rerun")
+    parser.add_argument("--json", help="Also write the report to this file")
+    args = parser.parse_args()
+
+    # Conversations and cached replies go to a scratch directory, never the app's own .cache
+    scratch = tempfile.TemporaryDirectory(prefix="carney-benchmark-")
+    os.environ["CARNEY_STORE_PATH"] = os.path.join(scratch.name, "conversations.db")
+    os.environ["CARNEY_RESPONSE_CACHE_DIR"] = os.path.join(scratch.name, "responses")
+    process, url = start_mock_server(args)
+    os.environ["GROQ_BASE_URL"] = url
+    os.environ["CARNEY_RESPONSE_CACHE"] = "1" if args.cache else "0"
+    os.environ.setdefault("CARNEY_REQUESTS_PER_MINUTE", str(args.rpm))
+    os.environ.setdefault("CARNEY_TOKENS_PER_MINUTE", str(args.tpm))
+    os.environ.setdefault("STREAMLIT_LOGGER_LEVEL", "error")  # AppTest warns on every bare-mode rerun
+    if args.render_interval is not None:
+        os.environ["CARNEY_RENDER_INTERVAL"] = str(args.render_interval)
+    if args.render_chars is not None:
+        os.environ["CARNEY_RENDER_CHARS"] = str(args.render_chars)
+    os.chdir(ROOT)
+
+    workers = max(1, min(args.concurrency, args.sessions))
+    shares = [list(range(args.sessions))[i::workers] for i in range(workers)]
+    try:
+        spawn = multiprocessing.get_context("spawn")  # A forked child would inherit warm imports
+        with ProcessPoolExecutor(max_workers=1, mp_context=spawn) as pool:
+            startup = pool.submit(measure_startup, args.timeout).result()
+        wall_before = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(run_worker, shares, [args.turns] * workers, [args.timeout] * workers))
+        wall = time.perf_counter() - wall_before
+    finally:
+        process.terminate()
+        process.wait()
+        scratch.cleanup()
+
+    latencies = [latency for result in results for latency in result["latencies"]]
+    reruns = args.sessions * (args.turns + 2)  # Initial run and welcome dismissal plus one per turn
+    rss_per_session = sum(result["rss_growth"] for result in results) / args.sessions
+    report = {
+        "streamlit_import_seconds": round(startup["streamlit_import_seconds"], 3),
+        "first_page_seconds": round(startup["first_page_seconds"], 3),
+        "first_page_rss_bytes": startup["first_page_rss_growth"],
+        "sessions": args.sessions,
+        "workers": workers,
+        "turns": len(latencies),
+        "errors": sum(result["errors"] for result in results),
+        "wall_seconds": round(wall, 3),
+        "turn_latency_p50": round(percentile(latencies, 0.50), 4),
+        "turn_latency_p99": round(percentile(latencies, 0.99), 4),
+        "turn_latency_mean": round(statistics.fmean(latencies), 4),
+        "cpu_seconds_per_rerun": round(sum(result["cpu_seconds"] for result in results) / reruns, 4),
+        "rss_bytes_per_session": int(rss_per_session),
+        "rss_mb_per_100_sessions": round(rss_per_session * 100 / 2 ** 20, 2),
+    }
+    for name, value in report.items():
+        print(f"{name:>24}: {value}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""Caching of streamed replies, and the in-memory LRU the app also uses for audio.
+
+Nothing here touches Streamlit; the app creates one ResponseCache per process with
+st.cache_resource and every session shares it.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# --- Configuration ---
+REPLAY_CHUNK_DELAY = 0.01  # Pause between replayed chunks so cached replies stream like live ones
+REPLAY_MAX_SECONDS = 1.5  # Upper bound on the total replay time of one reply
+
+# --- Caches ---
+class LRUCache:
+    """Thread-safe in-memory LRU cache whose entries expire after a TTL."""
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored_at, value = entry
+            if time.time() - stored_at > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, stored_at: float = None):
+        """Stores a value; stored_at keeps the age of an entry copied from elsewhere."""
+        with self._lock:
+            self._entries[key] = (time.time() if stored_at is None else stored_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+class DiskCache:
+    """JSON files on disk with TTL expiry and a cap on their total size."""
+
+    def __init__(self, directory: str, ttl: float, max_bytes: int):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._size = sum(entry.stat().st_size for entry in os.scandir(directory) if entry.name.endswith(".json"))
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key):
+        entry = self.get_entry(key)
+        return None if entry is None else entry[1]
+
+    def get_entry(self, key):
+        """Returns (stored_at, value) for a live entry, or None."""
+        path = self._path(key)
+        try:
+            stored_at = os.path.getmtime(path)
+            if time.time() - stored_at > self.ttl:
+                self._remove(path)
+                return None
+            with open(path, encoding="utf-8") as f:
+                return stored_at, json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def set(self, key, value):
+        path = self._path(key)
+        data = json.dumps(value).encode("utf-8")
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with self._lock:
+            try:
+                previous = os.path.getsize(path) if os.path.exists(path) else 0
+                with open(tmp_path, "wb") as f:
+                    f.write(data)
+                os.replace(tmp_path, path)  # Atomic, so readers never see a partial entry
+            except OSError:
+                return
+            self._size += len(data) - previous
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _remove(self, path: str):
+        with self._lock:
+            try:
+                size = os.path.getsize(path)
+                os.remove(path)
+                self._size -= size
+            except OSError:
+                pass
+
+    def _evict(self):
+        """Deletes expired entries, then the oldest ones, until under the size cap. Caller holds the lock."""
+        entries = sorted(
+            (entry for entry in os.scandir(self.directory) if entry.name.endswith(".json")),
+            key=lambda entry: entry.stat().st_mtime,
+        )
+        now = time.time()
+        for entry in entries:
+            if self._size <= self.max_bytes and now - entry.stat().st_mtime <= self.ttl:
+                break
+            try:
+                size = entry.stat().st_size
+                os.remove(entry.path)
+                self._size -= size
+            except OSError:
+                pass
+
+class ResponseCache:
+    """Two-tier cache of streamed replies: an in-memory LRU backed by a disk store."""
+
+    def __init__(self, directory: str, ttl: float, max_entries: int, max_bytes: int):
+        self.memory = LRUCache(max_entries, ttl)
+        self.disk = DiskCache(directory, ttl, max_bytes)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()  # Guards the counters, which every session updates
+
+    def get(self, key):
+        """Returns the cached reply chunks, or None on a miss."""
+        chunks = self.memory.get(key)
+        if chunks is None:
+            entry = self.disk.get_entry(key)
+            if entry is not None:
+                stored_at, chunks = entry
+                self.memory.set(key, chunks, stored_at)  # Promote to the fast tier without renewing its TTL
+        with self._lock:
+            if chunks is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return chunks
+
+    def set(self, key, chunks):
+        self.memory.set(key, chunks)
+        self.disk.set(key, chunks)
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        total = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / total if total else 0.0,
+            "memory_entries": len(self.memory),
+        }
+
+# --- Reply Keys and Replay ---
+def response_cache_key(model: str, messages, temperature: float, max_tokens: int) -> str:
+    """Hashes everything that determines a reply into a cache key."""
+    system_hash = hashlib.sha256(messages[0]["content"].encode("utf-8")).hexdigest()
+    payload = json.dumps(
+        {
+            "model": model,
+            "system": system_hash,
+            "messages": messages[1:],
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+        },
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def replay_cached_response(chunks):
+    """Yields cached chunks at a gentle pace, mirroring a live stream."""
+    delay = min(REPLAY_CHUNK_DELAY, REPLAY_MAX_SECONDS / max(len(chunks), 1))
+    for chunk in chunks:
+        yield chunk
+        if delay:
+            time.sleep(delay)
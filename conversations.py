@@ -0,0 +1,76 @@
+"""The append-only SQLite log that conversations are kept in and resumed from.
+
+The app opens one ConversationStore per process with st.cache_resource; nothing here
+touches Streamlit.
+"""
+import os
+import sqlite3
+import threading
+import time
+
+# --- Configuration ---
+HISTORY_RECALL_QUESTIONS = 20  # Older questions read back when a conversation resumes, for the "earlier" note
+
+# --- Conversation Store ---
+class ConversationStore:
+    """Append-only SQLite log of conversations, in WAL mode so readers never block the writer.
+
+    Streamlit runs sessions on many threads, so each thread gets its own connection.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS messages (
+            conversation_id TEXT NOT NULL,
+            seq INTEGER NOT NULL,
+            role TEXT NOT NULL,
+            content TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            PRIMARY KEY (conversation_id, seq)
+        ) WITHOUT ROWID;
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._connection().executescript(self.SCHEMA)
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")  # Durable enough for chat logs, and far fewer fsyncs
+            self._local.connection = connection
+        return connection
+
+    def append(self, conversation_id: str, role: str, content: str):
+        """Appends one message; the next sequence number is assigned inside the insert."""
+        self._connection().execute(
+            """INSERT INTO messages (conversation_id, seq, role, content, created_at)
+               SELECT ?, COALESCE(MAX(seq), 0) + 1, ?, ?, ? FROM messages WHERE conversation_id = ?""",
+            (conversation_id, role, content, time.time(), conversation_id),
+        )
+
+    def count(self, conversation_id: str) -> int:
+        row = self._connection().execute(
+            "SELECT COALESCE(MAX(seq), 0) FROM messages WHERE conversation_id = ?", (conversation_id,)
+        ).fetchone()
+        return row[0]
+
+    def questions(self, conversation_id: str, last_seq: int, limit: int = HISTORY_RECALL_QUESTIONS):
+        """Returns the visitor's latest questions up to a sequence number, oldest first."""
+        rows = self._connection().execute(
+            """SELECT content FROM messages WHERE conversation_id = ? AND role = 'user' AND seq <= ?
+               ORDER BY seq DESC LIMIT ?""",
+            (conversation_id, last_seq, limit),
+        ).fetchall()
+        return [content for content, in reversed(rows)]
+
+    def load(self, conversation_id: str, first_seq: int, last_seq: int):
+        """Returns (role, content) pairs for a range of sequence numbers, oldest first."""
+        return self._connection().execute(
+            "SELECT role, content FROM messages WHERE conversation_id = ? AND seq BETWEEN ? AND ? ORDER BY seq",
+            (conversation_id, first_seq, last_seq),
+        ).fetchall()
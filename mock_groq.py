@@ -0,0 +1,248 @@
+"""Local stand-in for the Groq API, for benchmarks and offline testing.
+
+Serves streaming and non-streaming chat completions, Whisper transcriptions, speech
+and the model list with a configurable token rate, latency and error injection. Point the app
+or the SDK at it through GROQ_BASE_URL:
+
+    python mock_groq.py --port 8765 --token-rate 400 --latency 0.2 --error-rate 0.05
+    GROQ_BASE_URL=http://127.0.0.1:8765 streamlit run streamlit_app.py
+"""
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+import uuid
+import wave
+from io import BytesIO
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+REPLY_WORDS = (
+    "Hark friend the colors of the Union flew high above the parapet at Fort Wagner "
+    "and though the shot fell thick as hail we of the 54th Massachusetts pressed on "
+    "for liberty and for our brethren yet in bondage the old flag never touched the ground"
+).split()
+
+RATE_LIMIT_REQUESTS = 30
+RATE_LIMIT_TOKENS = 6000
+
+
+class MockGroqServer:
+    """Threaded HTTP server imitating the parts of the Groq API the app uses."""
+
+    def __init__(self, host="127.0.0.1", port=0, token_rate=200.0, latency=0.1, error_rate=0.0,
+                 error_status=429, reply_tokens=120, seed=None, fail_models=()):
+        self.token_rate = token_rate
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.reply_tokens = reply_tokens
+        self.fail_models = set(fail_models)
+        self.counts = {"chat": 0, "transcriptions": 0, "speech": 0, "models": 0, "errors": 0}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def serve_forever(self):
+        self._server.serve_forever()
+
+    def _count(self, endpoint: str, model: str = "") -> bool:
+        """Counts a request and decides whether to fail it."""
+        with self._lock:
+            self.counts[endpoint] += 1
+            failed = model in self.fail_models or self._random.random() < self.error_rate
+            if failed:
+                self.counts["errors"] += 1
+        return failed
+
+    def reply_for(self, prompt: str) -> list:
+        """Builds a deterministic reply for a prompt, one word per token."""
+        rng = random.Random(hashlib.sha256(prompt.encode("utf-8")).hexdigest())
+        return [rng.choice(REPLY_WORDS) for _ in range(self.reply_tokens)]
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _read_body(self) -> bytes:
+                return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+            def _rate_limit_headers(self):
+                self.send_header("x-ratelimit-limit-requests", str(RATE_LIMIT_REQUESTS))
+                self.send_header("x-ratelimit-remaining-requests", str(RATE_LIMIT_REQUESTS - 1))
+                self.send_header("x-ratelimit-limit-tokens", str(RATE_LIMIT_TOKENS))
+                self.send_header("x-ratelimit-remaining-tokens", str(RATE_LIMIT_TOKENS - server.reply_tokens))
+
+            def _send_json(self, status: int, payload: dict, extra_headers=None):
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self._rate_limit_headers()
+                for name, value in (extra_headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _send_error(self):
+                status = server.error_status
+                kind = "rate_limit_exceeded" if status == 429 else "internal_server_error"
+                headers = {"retry-after": "1"} if status == 429 else {}
+                self._send_json(status, {"error": {"message": f"Injected {status} from mock server", "type": kind}}, headers)
+
+            def do_GET(self):
+                if self.path.rstrip("/").endswith("/models"):
+                    server._count("models")
+                    self._send_json(200, {"object": "list", "data": []})
+                else:
+                    self._send_json(404, {"error": {"message": "Not found", "type": "not_found"}})
+
+            def do_POST(self):
+                body = self._read_body()
+                if self.path.endswith("/chat/completions"):
+                    self._chat(json.loads(body))
+                elif self.path.endswith("/audio/transcriptions"):
+                    self._transcription(body)
+                elif self.path.endswith("/audio/speech"):
+                    self._speech(json.loads(body))
+                else:
+                    self._send_json(404, {"error": {"message": "Not found", "type": "not_found"}})
+
+            def _chat(self, request: dict):
+                failed = server._count("chat", request.get("model", ""))
+                time.sleep(server.latency)
+                if failed:
+                    self._send_error()
+                    return
+                prompt = json.dumps(request.get("messages", []), sort_keys=True)
+                words = server.reply_for(prompt)[:request.get("max_tokens") or server.reply_tokens]
+                prompt_tokens = len(prompt) // 4
+                usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(words), "total_tokens": prompt_tokens + len(words)}
+                completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+                if not request.get("stream"):
+                    self._send_json(200, {
+                        "id": completion_id,
+                        "object": "chat.completion",
+                        "created": int(time.time()),
+                        "model": request.get("model", ""),
+                        "choices": [{"index": 0, "message": {"role": "assistant", "content": " ".join(words)}, "finish_reason": "stop"}],
+                        "usage": usage,
+                    })
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self._rate_limit_headers()
+                self.end_headers()
+                delay = 1.0 / server.token_rate if server.token_rate > 0 else 0.0
+
+                def chunk(delta, finish_reason=None, x_groq=None):
+                    payload = {
+                        "id": completion_id,
+                        "object": "chat.completion.chunk",
+                        "created": int(time.time()),
+                        "model": request.get("model", ""),
+                        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+                    }
+                    if x_groq:
+                        payload["x_groq"] = x_groq
+                    return json.dumps(payload)
+
+                try:
+                    self._write_event(chunk({"role": "assistant", "content": ""}))
+                    for i, word in enumerate(words):
+                        self._write_event(chunk({"content": word if i == 0 else f" {word}"}))
+                        if delay:
+                            time.sleep(delay)
+                    self._write_event(chunk({}, "stop", {"id": completion_id, "usage": usage}))
+                    self._write_event("[DONE]")
+                    self.wfile.write(b"0\r\n\r\n")
+                    self.wfile.flush()
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # Client went away mid-stream
+
+            def _write_event(self, data: str):
+                event = f"data: {data}\n\n".encode("utf-8")
+                self.wfile.write(f"{len(event):x}\r\n".encode("ascii") + event + b"\r\n")
+                self.wfile.flush()
+
+            def _transcription(self, body: bytes):
+                failed = server._count("transcriptions")
+                time.sleep(server.latency)
+                if failed:
+                    self._send_error()
+                    return
+                digest = hashlib.sha256(body).hexdigest()[:8]
+                self._send_json(200, {"text": f"What befell at Fort Wagner? ({digest})", "x_groq": {"id": f"req_{digest}"}})
+
+            def _speech(self, request: dict):
+                failed = server._count("speech")
+                time.sleep(server.latency)
+                if failed:
+                    self._send_error()
+                    return
+                # Silence lasting a fifth of a second per word
+                words = len(request.get("input", "").split())
+                buffer = BytesIO()
+                with wave.open(buffer, "wb") as wav:
+                    wav.setnchannels(1)
+                    wav.setsampwidth(2)
+                    wav.setframerate(8000)
+                    wav.writeframes(b"\0\0" * 1600 * words)
+                body = buffer.getvalue()
+                self.send_response(200)
+                self.send_header("Content-Type", "audio/wav")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765, help="0 picks a free port")
+    parser.add_argument("--token-rate", type=float, default=200.0, help="Streamed tokens per second; 0 for no delay")
+    parser.add_argument("--latency", type=float, default=0.1, help="Seconds before each response starts")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests that fail")
+    parser.add_argument("--error-status", type=int, default=429, help="HTTP status for injected failures")
+    parser.add_argument("--reply-tokens", type=int, default=120, help="Tokens per chat reply")
+    parser.add_argument("--seed", type=int, default=None, help="Seed for error injection")
+    parser.add_argument("--fail-model", action="append", default=[], help="Always fail requests for this model")
+    args = parser.parse_args()
+
+    server = MockGroqServer(args.host, args.port, args.token_rate, args.latency, args.error_rate,
+                            args.error_status, args.reply_tokens, args.seed, args.fail_model)
+    print(f"Mock Groq API listening on {server.url}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""Who Sergeant Carney is and what each request to the model contains.
+
+Shared by the Streamlit app and the headless batch evaluator, so both send the same
+system prompt, models and context for a question. Everything here is built once when
+the module is first imported and shared by every session in the process.
+"""
+
+# --- Configuration ---
+APP_NAME = "Sergeant Carney"
+APP_TAGLINE = "A Conversation with a Civil War Hero"
+DEFAULT_MODEL_INDEX = 1
+
+# Context window budgeting
+CHARS_PER_TOKEN = 4  # Rough estimate; Groq does not expose its tokenizers
+MESSAGE_TOKEN_OVERHEAD = 4  # Role and formatting tokens added to every message
+CONTEXT_SAFETY_MARGIN = 64  # Headroom for estimation error
+MIN_REPLY_TOKENS = 256  # Smallest reply budget we will trim history down to
+SUMMARY_MAX_CHARS = 400  # Length cap for the note standing in for dropped turns
+
+# Default request parameters (also used to warm the response cache)
+DEFAULT_MAX_TOKENS = 2048
+DEFAULT_TEMPERATURE = 0.7
+
+# Sidebar quick prompts with period-appropriate phrasing
+QUICK_PROMPTS = [
+    "Pray, tell me of thy days afore the war.",
+    "What befell at the storming of Fort Wagner?",
+    "How didst thou bear the colors in battle?",
+    "What trials did the 54th Massachusetts endure?"
+]
+
+# Reference notes drawn from the source corpus
+RETRIEVAL_TOP_K = 3
+RETRIEVAL_MIN_SCORE = 1.0  # Weaker matches are more likely noise than help
+RETRIEVAL_TOKEN_BUDGET = 400  # Prompt tokens the passages may use on each turn
+RETRIEVAL_NOTES_HEADER = "Notes on thy life and regiment, drawn from later histories, that may aid thy answer:"
+
+# --- System Prompt with 19th-Century Language ---
+# Defines the personality and tone of Sergeant Carney using period-appropriate language
+SYSTEM_PROMPT = """Thou art Sergeant William Harvey Carney, a man of the 54th Massachusetts Volunteer Infantry. 
+    Born a bondsman in Norfolk, Virginia, in the year of our Lord 1840, thou didst flee the yoke of slavery by the secret paths of the Underground Railroad, seeking liberty in the North. 
+    In the year 1863, on the eighteenth day of July, thou didst stand with thy comrades in arms afore Fort Wagner in South Carolina, bearing the colors of the Union with valor. 
+    Speak thou with the dignity of a freedman, the courage of a soldier, and the solemn duty of one who hath seen bondage and battle. 
+    Tell of thy deeds and the doings of the 54th Massachusetts with truth, as one who hath lived it. 
+    Use the tongue of the mid-19th century, with words and ways of speech common to that time, shunning all modern phrases and things unknown in the 1860s. 
+    When it be fitting, recount the trials of thy brethren, men of color in the Union ranks, and the great worth of their service to the cause of freedom."""
+
+def _get_system_prompt() -> str:
+    """Returns the shared system prompt."""
+    return SYSTEM_PROMPT
+
+# --- Context Window Management ---
+def estimate_tokens(text: str) -> int:
+    """Estimates how many tokens a message occupies in the prompt."""
+    return len(text) // CHARS_PER_TOKEN + MESSAGE_TOKEN_OVERHEAD
+
+# Sessions keep only their own turns; every request starts from this one message
+SYSTEM_MESSAGE = {"role": "system", "content": SYSTEM_PROMPT}
+SYSTEM_PROMPT_TOKENS = estimate_tokens(SYSTEM_PROMPT)
+
+def recall_questions(questions, earlier: str = "") -> str:
+    """Appends the visitor's questions to those already recalled, keeping the most recent."""
+    recalled = "; ".join(part for part in [earlier, *(q.strip() for q in questions)] if part)
+    if len(recalled) > SUMMARY_MAX_CHARS:
+        recalled = "..." + recalled[-SUMMARY_MAX_CHARS:]
+    return recalled
+
+def _summarize_dropped(dropped, earlier: str = "") -> str:
+    """Builds a short note recalling the visitor's questions from trimmed turns."""
+    recalled = recall_questions((m["content"] for m in dropped if m["role"] == "user"), earlier)
+    if not recalled:
+        return ""
+    return f"Earlier in this conversation the visitor asked: {recalled}"
+
+def build_context(messages, token_counts, context_limit: int, max_tokens: int, notes: str = "", earlier: str = ""):
+    """Selects the messages to send so the prompt and reply fit the model's context window.
+
+    The system prompt, any reference notes and the newest message are always kept. Older
+    turns are dropped oldest first and replaced by a brief note of the questions they
+    contained, after earlier: questions recalled from turns the caller no longer holds.
+    Returns the messages and the reply token budget, which shrinks if the prompt cannot.
+    """
+    head = [messages[0]]
+    notes_tokens = 0
+    if notes:
+        head.append({"role": "system", "content": notes})
+        notes_tokens = estimate_tokens(notes)
+    budget = context_limit - CONTEXT_SAFETY_MARGIN
+    required = token_counts[0] + notes_tokens + token_counts[-1]
+    reply_tokens = max(min(max_tokens, budget - required), MIN_REPLY_TOKENS)
+    prompt_budget = budget - reply_tokens
+    if not earlier and sum(token_counts) + notes_tokens <= prompt_budget:
+        return (head + messages[1:] if notes else messages), reply_tokens
+
+    # Walk back from the newest message, reserving room for the summary note
+    used = required + estimate_tokens("x" * (SUMMARY_MAX_CHARS + 60))
+    reply_tokens = max(min(max_tokens, budget - used), MIN_REPLY_TOKENS)
+    prompt_budget = budget - reply_tokens
+    start = len(messages) - 1
+    while start > 1 and used + token_counts[start - 1] <= prompt_budget:
+        start -= 1
+        used += token_counts[start]
+    # Never open the kept history on an assistant reply
+    while start < len(messages) - 1 and messages[start]["role"] != "user":
+        start += 1
+
+    context = head
+    summary = _summarize_dropped(messages[1:start], earlier)
+    if summary:
+        context.append({"role": "system", "content": summary})
+    context.extend(messages[start:])
+    return context, reply_tokens
+
+# --- Model Options ---
+models = {
+    "llama-3.3-70b-versatile": {"name": "Llama-3.3-70b-Versatile", "tokens": 8192, "developer": "Meta", "description": "Latest Llama model for versatile, detailed medical responses"},
+    "Llama3-8b-8192": {"name": "Llama3-8b-8192", "tokens": 8192, "developer": "Meta", "description": "Efficient Llama model for fast, accurate medical insights"},
+    "mistral-saba-24b": {"name": "Mistral-Saba-24b", "tokens": 32768, "developer": "Mistral", "description": "Specialized model with large context for in-depth narratives"},
+    "mixtral-8x22b-instruct": {"name": "Mixtral-8x22b-Instruct", "tokens": 65536, "developer": "Mistral", "description": "Advanced Mixtral for complex medical analysis"},
+    "gemma-2-27b-it": {"name": "Gemma-2-27b-IT", "tokens": 8192, "developer": "Google", "description": "Updated Gemma model for general-purpose medical dialogue"},
+    "llama-3.2-1b-preview": {"name": "Llama-3.2-1b-Preview", "tokens": 4096, "developer": "Meta", "description": "Lightweight Llama model for quick responses and basic assistance"},
+}
+
+# --- Reference Notes ---
+def format_reference_notes(passages) -> str:
+    """Builds the system note of retrieved passages, keeping within the token budget."""
+    entries = []
+    used = estimate_tokens(RETRIEVAL_NOTES_HEADER)
+    for passage in passages:
+        if passage.score < RETRIEVAL_MIN_SCORE:
+            break
+        entry = f"[{passage.source}] {passage.text}"
+        if used + estimate_tokens(entry) > RETRIEVAL_TOKEN_BUDGET:
+            continue  # A shorter passage further down may still fit
+        entries.append(entry)
+        used += estimate_tokens(entry)
+    return "\n\n".join([RETRIEVAL_NOTES_HEADER] + entries) if entries else ""
@@ -0,0 +1,55 @@
+"""Throttled redraws of a reply while it streams in.
+
+The renderer only calls markdown() on the placeholder it is given, so it works with any
+Streamlit container and can be tested without one.
+"""
+import time
+
+# --- Configuration ---
+RENDER_FLUSH_INTERVAL = 0.05  # Seconds between placeholder redraws while a reply streams
+RENDER_FLUSH_CHARS = 200  # Redraw sooner once this much new text has arrived
+STREAM_CURSOR = "▌"
+
+# --- Streaming Renderer ---
+class StreamRenderer:
+    """Buffers streamed chunks and redraws the placeholder at a bounded rate.
+
+    Each redraw sends the whole reply over the websocket, so redrawing per token costs
+    quadratic bandwidth. The counters let that overhead be compared across settings.
+    """
+
+    def __init__(self, placeholder, interval: float = RENDER_FLUSH_INTERVAL, flush_chars: int = RENDER_FLUSH_CHARS):
+        self.placeholder = placeholder
+        self.interval = interval
+        self.flush_chars = flush_chars
+        self._parts = []
+        self._pending_chars = 0
+        self._last_flush = 0.0  # Show the first chunk right away
+        self.flushes = 0
+        self.chars_sent = 0
+        self.render_seconds = 0.0
+
+    def write(self, chunk: str):
+        self._parts.append(chunk)
+        self._pending_chars += len(chunk)
+        if self._pending_chars >= self.flush_chars or time.perf_counter() - self._last_flush >= self.interval:
+            self._flush(STREAM_CURSOR)
+
+    def close(self) -> str:
+        """Renders the complete reply without the cursor and returns its text."""
+        return self._flush("")
+
+    def _flush(self, cursor: str) -> str:
+        text = "".join(self._parts)
+        self._parts = [text]  # Keep later joins to two parts
+        started = time.perf_counter()
+        self.placeholder.markdown(text + cursor)
+        self._last_flush = time.perf_counter()
+        self.render_seconds += self._last_flush - started
+        self.chars_sent += len(text) + len(cursor)
+        self.flushes += 1
+        self._pending_chars = 0
+        return text
+
+    def stats(self) -> dict:
+        return {"flushes": self.flushes, "chars_sent": self.chars_sent, "render_seconds": self.render_seconds}
@@ -0,0 +1,258 @@
+"""BM25 retrieval over the local corpus of source material about Carney and the 54th.
+
+Markdown and text files under corpus/ are cut into passages and indexed offline into
+a handful of NumPy arrays and a text blob, which the app memory-maps on first use:
+
+    python retrieval.py build
+    python retrieval.py search "How was Carney wounded at Fort Wagner?"
+
+Each term's postings hold precomputed BM25 weights, so a query is a few vector adds
+over the passages that contain its terms.
+"""
+import argparse
+import hashlib
+import json
+import math
+import os
+import re
+import time
+from collections import Counter, namedtuple
+
+import numpy as np
+
+# Next to this file, so the app finds its corpus whatever directory it is started from
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CORPUS_DIR = os.path.join(BASE_DIR, "corpus")
+INDEX_DIR = os.path.join(BASE_DIR, ".cache", "retrieval")
+INDEX_VERSION = 1
+PASSAGE_WORDS = 120  # Paragraphs are merged up to about this many words per passage
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+STOPWORDS = frozenset("""
+a an and are as at be but by did didst do doth for from had hath have he his how i in is it
+its me my of on or our she so that the thee their them there they thou thy to was we were
+what when where which who why will with ye you your art tell pray friend
+""".split())
+
+Passage = namedtuple("Passage", "source text score")
+
+
+def tokenize(text: str) -> list:
+    """Lowercases text into index terms, dropping stopwords and plural endings."""
+    terms = []
+    for word in re.findall(r"[a-z0-9]+", text.lower()):
+        if word in STOPWORDS:
+            continue
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        terms.append(word)
+    return terms
+
+
+def corpus_files(corpus_dir: str) -> list:
+    if not os.path.isdir(corpus_dir):
+        return []
+    return sorted(
+        os.path.join(corpus_dir, name) for name in os.listdir(corpus_dir)
+        if name.endswith((".md", ".txt"))
+    )
+
+
+def corpus_digest(corpus_dir: str) -> str:
+    """Hashes the corpus so a stale index can be detected."""
+    digest = hashlib.sha256()
+    for path in corpus_files(corpus_dir):
+        digest.update(os.path.basename(path).encode("utf-8") + b"\0")
+        with open(path, "rb") as f:
+            digest.update(f.read() + b"\0")
+    return digest.hexdigest()
+
+
+def split_passages(text: str, max_words: int = PASSAGE_WORDS):
+    """Returns the document title and its paragraphs merged into passages of about max_words."""
+    title = ""
+    paragraphs = []
+    for block in re.split(r"\n\s*\n", text):
+        block = " ".join(block.split())
+        if not block:
+            continue
+        if block.startswith("#"):
+            title = title or block.lstrip("#").strip()
+            continue
+        paragraphs.append(block)
+
+    passages = []
+    current = []
+    for paragraph in paragraphs:
+        if current and len(" ".join(current + [paragraph]).split()) > max_words:
+            passages.append(" ".join(current))
+            current = []
+        current.append(paragraph)
+    if current:
+        passages.append(" ".join(current))
+    return title, passages
+
+
+def _write(index_dir: str, name: str, write):
+    """Writes one index file under a temporary name and swaps it in, so readers never see it partial."""
+    path = os.path.join(index_dir, name)
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "wb") as f:
+        write(f)
+    os.replace(temporary, path)
+
+
+def build_index(corpus_dir: str = CORPUS_DIR, index_dir: str = INDEX_DIR) -> dict:
+    """Indexes the corpus into index_dir and returns its metadata."""
+    sources = []
+    passages = []
+    passage_sources = []
+    for path in corpus_files(corpus_dir):
+        with open(path, encoding="utf-8") as f:
+            title, chunks = split_passages(f.read())
+        sources.append(title or os.path.splitext(os.path.basename(path))[0])
+        passages.extend(chunks)
+        passage_sources.extend([len(sources) - 1] * len(chunks))
+
+    term_counts = [Counter(tokenize(passage)) for passage in passages]
+    lengths = np.array([sum(counts.values()) for counts in term_counts], dtype=np.float32)
+    average_length = float(lengths.mean()) if len(passages) else 0.0
+    postings = {}
+    for doc, counts in enumerate(term_counts):
+        for term, count in counts.items():
+            postings.setdefault(term, []).append((doc, count))
+
+    terms = sorted(postings)
+    offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+    docs = []
+    weights = []
+    for i, term in enumerate(terms):
+        idf = math.log(1 + (len(passages) - len(postings[term]) + 0.5) / (len(postings[term]) + 0.5))
+        for doc, count in postings[term]:
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths[doc] / average_length)
+            docs.append(doc)
+            weights.append(idf * count * (BM25_K1 + 1) / (count + norm))
+        offsets[i + 1] = len(docs)
+
+    blob = bytearray()
+    passage_offsets = [0]
+    for passage in passages:
+        blob += passage.encode("utf-8")
+        passage_offsets.append(len(blob))
+
+    os.makedirs(index_dir, exist_ok=True)
+    _write(index_dir, "offsets.npy", lambda f: np.save(f, offsets))
+    _write(index_dir, "docs.npy", lambda f: np.save(f, np.array(docs, dtype=np.int32)))
+    _write(index_dir, "weights.npy", lambda f: np.save(f, np.array(weights, dtype=np.float32)))
+    _write(index_dir, "passage_offsets.npy", lambda f: np.save(f, np.array(passage_offsets, dtype=np.int64)))
+    _write(index_dir, "passage_sources.npy", lambda f: np.save(f, np.array(passage_sources, dtype=np.int32)))
+    _write(index_dir, "passages.bin", lambda f: f.write(bytes(blob)))
+    meta = {
+        "version": INDEX_VERSION,
+        "digest": corpus_digest(corpus_dir),
+        "sources": sources,
+        "terms": terms,
+    }
+    # Written last, so a half-built index is never loaded
+    _write(index_dir, "meta.json", lambda f: f.write(json.dumps(meta).encode("utf-8")))
+    return meta
+
+
+class RetrievalIndex:
+    """Read-only BM25 index whose arrays stay memory-mapped on disk."""
+
+    def __init__(self, index_dir: str = INDEX_DIR):
+        with open(os.path.join(index_dir, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("version") != INDEX_VERSION:
+            raise ValueError(f"Index at {index_dir} has version {meta.get('version')}, expected {INDEX_VERSION}")
+        self.digest = meta["digest"]
+        self.sources = meta["sources"]
+        self._term_ids = {term: i for i, term in enumerate(meta["terms"])}
+
+        def load(name):
+            return np.load(os.path.join(index_dir, name), mmap_mode="r")
+
+        self._offsets = load("offsets.npy")
+        self._docs = load("docs.npy")
+        self._weights = load("weights.npy")
+        self._passage_offsets = load("passage_offsets.npy")
+        self._passage_sources = load("passage_sources.npy")
+        blob_path = os.path.join(index_dir, "passages.bin")
+        self._blob = np.memmap(blob_path, dtype=np.uint8, mode="r") if os.path.getsize(blob_path) else np.zeros(0, np.uint8)
+
+    def __len__(self):
+        return len(self._passage_sources)
+
+    def search(self, query: str, k: int = 3) -> list:
+        """Returns up to k passages ranked by BM25 score against the query."""
+        ids = {self._term_ids[term] for term in tokenize(query) if term in self._term_ids}
+        if not ids:
+            return []
+        scores = np.zeros(len(self), dtype=np.float32)
+        for i in ids:
+            start, end = self._offsets[i], self._offsets[i + 1]
+            scores[self._docs[start:end]] += self._weights[start:end]  # A term lists each passage once
+        k = min(k, int(np.count_nonzero(scores)))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [Passage(self.sources[self._passage_sources[doc]], self.passage(doc), float(scores[doc])) for doc in top]
+
+    def passage(self, doc: int) -> str:
+        start, end = self._passage_offsets[doc], self._passage_offsets[doc + 1]
+        return bytes(self._blob[start:end]).decode("utf-8")
+
+
+def load_index(corpus_dir: str = CORPUS_DIR, index_dir: str = INDEX_DIR):
+    """Loads the index, rebuilding it first if it is missing or older than the corpus.
+
+    Returns None when there is no corpus to index.
+    """
+    if not corpus_files(corpus_dir):
+        return None
+    digest = corpus_digest(corpus_dir)
+    try:
+        index = RetrievalIndex(index_dir)
+        if index.digest == digest:
+            return index
+    except (OSError, ValueError, KeyError):
+        pass
+    build_index(corpus_dir, index_dir)
+    return RetrievalIndex(index_dir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--corpus", default=CORPUS_DIR, help="Directory of .md and .txt sources")
+    parser.add_argument("--index", default=INDEX_DIR, help="Directory the index is written to")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("build", help="Index the corpus")
+    search = commands.add_parser("search", help="Show the passages a question retrieves")
+    search.add_argument("query")
+    search.add_argument("-k", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        started = time.perf_counter()
+        meta = build_index(args.corpus, args.index)
+        index = RetrievalIndex(args.index)
+        print(f"Indexed {len(index)} passages from {len(meta['sources'])} sources "
+              f"({len(meta['terms'])} terms) in {time.perf_counter() - started:.3f}s")
+        return
+
+    index = load_index(args.corpus, args.index)
+    if index is None:
+        parser.error(f"No corpus files found in {args.corpus}")
+    started = time.perf_counter()
+    results = index.search(args.query, args.k)
+    elapsed = time.perf_counter() - started
+    for passage in results:
+        print(f"[{passage.score:.2f}] {passage.source}: {passage.text}\n")
+    print(f"{len(results)} passages in {elapsed * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""Choosing which model answers, from how each one has been behaving lately.
+
+One ModelRouter per process learns from every session's requests; nothing here touches
+Streamlit.
+"""
+import random
+import re
+import threading
+import time
+from collections import deque
+
+# --- Configuration ---
+AUTO_MODEL = "auto"  # Selectbox entry that routes to the fastest healthy model
+ROUTER_MAX_ATTEMPTS = 3
+ROUTER_BACKOFF_BASE = 0.5  # Seconds before the first retry; doubles per attempt, with jitter
+ROUTER_BACKOFF_MAX = 8.0
+ROUTER_WINDOW_SECONDS = 300  # How far back error rates look
+ROUTER_MIN_SAMPLES = 3  # Requests needed in the window before an error rate counts
+ROUTER_MAX_ERROR_RATE = 0.5  # Above this a model is degraded
+ROUTER_MAX_FIRST_CHUNK_SECONDS = 5.0  # Typical time to first chunk above this is degraded
+ROUTER_LATENCY_WEIGHT = 0.3  # Weight of the newest sample in the moving average
+ROUTER_PRIOR_FIRST_CHUNK_SECONDS = 1.0  # Optimistic guess for a model auto has not measured yet
+ROUTER_EXPLORE_RATE = 0.05  # Share of auto requests that lead with a model other than the fastest
+
+# --- Model Routing ---
+def is_transient(error: Exception) -> bool:
+    """True for rate limits, server errors, timeouts and dropped connections, not bad requests."""
+    from groq import APIError, APIStatusError
+    import httpx
+    if isinstance(error, APIStatusError):
+        return error.status_code == 429 or error.status_code >= 500
+    # Connection errors and timeouts, or an error event the server sent partway through a stream
+    return isinstance(error, (APIError, httpx.TransportError))
+
+def _parse_reset(value):
+    """Parses Groq rate-limit reset durations such as '7.66s', '2m59.56s' or '120ms' into seconds."""
+    if not value:
+        return None
+    seconds = 0.0
+    for amount, unit in re.findall(r"([\d.]+)(ms|h|m|s)", value):
+        seconds += float(amount) * {"ms": 0.001, "s": 1, "m": 60, "h": 3600}[unit]
+    return seconds
+
+class ModelRouter:
+    """Tracks latency, errors and rate limits per model and orders models to try.
+
+    A model is degraded while it is cooling down after a rate limit, when most of its
+    recent requests failed, or when its typical time to first chunk is too slow.
+    """
+
+    def __init__(self, model_ids, fallback_models, explore_rate: float = ROUTER_EXPLORE_RATE):
+        self.fallback_models = list(fallback_models)  # Fast models to fail over to, in order
+        self.explore_rate = explore_rate
+        self._lock = threading.Lock()
+        self._latency = {model: None for model in model_ids}
+        self._outcomes = {model: deque() for model in model_ids}
+        self._cooldown_until = {model: 0.0 for model in model_ids}
+
+    def record_success(self, model: str, first_chunk_seconds: float, headers=None):
+        with self._lock:
+            previous = self._latency[model]
+            self._latency[model] = first_chunk_seconds if previous is None else (
+                ROUTER_LATENCY_WEIGHT * first_chunk_seconds + (1 - ROUTER_LATENCY_WEIGHT) * previous
+            )
+            self._record_outcome(model, True)
+            if headers is not None:
+                self._apply_rate_limits(model, headers)
+
+    def record_failure(self, model: str, error: Exception):
+        """Counts a failed request against the model, unless the request itself was at fault."""
+        from groq import APIStatusError
+        if not is_transient(error):
+            return
+        with self._lock:
+            self._record_outcome(model, False)
+            if isinstance(error, APIStatusError):
+                self._apply_rate_limits(model, error.response.headers)
+                if error.status_code == 429 and self._cooldown_until[model] <= time.time():
+                    self._cooldown_until[model] = time.time() + ROUTER_BACKOFF_BASE * 4
+
+    def _record_outcome(self, model: str, ok: bool):
+        outcomes = self._outcomes[model]
+        now = time.time()
+        outcomes.append((now, ok))
+        while outcomes and now - outcomes[0][0] > ROUTER_WINDOW_SECONDS:
+            outcomes.popleft()
+
+    def _apply_rate_limits(self, model: str, headers):
+        """Starts a cooldown when Groq says the request or token quota is exhausted."""
+        wait = None
+        retry_after = headers.get("retry-after")
+        if retry_after:
+            try:
+                wait = float(retry_after)
+            except ValueError:
+                pass
+        if headers.get("x-ratelimit-remaining-requests") == "0":
+            wait = max(wait or 0.0, _parse_reset(headers.get("x-ratelimit-reset-requests")) or 0.0)
+        if headers.get("x-ratelimit-remaining-tokens") == "0":
+            wait = max(wait or 0.0, _parse_reset(headers.get("x-ratelimit-reset-tokens")) or 0.0)
+        if wait:
+            self._cooldown_until[model] = max(self._cooldown_until[model], time.time() + wait)
+
+    def is_healthy(self, model: str) -> bool:
+        with self._lock:
+            if self._cooldown_until[model] > time.time():
+                return False
+            outcomes = self._outcomes[model]
+            if len(outcomes) >= ROUTER_MIN_SAMPLES:
+                error_rate = sum(1 for _, ok in outcomes if not ok) / len(outcomes)
+                if error_rate > ROUTER_MAX_ERROR_RATE:
+                    return False
+            latency = self._latency[model]
+            return latency is None or latency <= ROUTER_MAX_FIRST_CHUNK_SECONDS
+
+    def candidates(self, selected: str, explore: bool = True):
+        """Orders the models to try for a request, best first.
+
+        Without explore, auto always leads with its current best guess, as for display.
+        """
+        if selected == AUTO_MODEL:
+            fallback_rank = {model: i for i, model in enumerate(self.fallback_models)}
+            with self._lock:
+                latency = dict(self._latency)
+            # Unmeasured models rank by an optimistic guess, so each gets tried instead of losing
+            # forever to whichever model answered first; ties go to the known-fast fallbacks
+            ordered = sorted(
+                latency,
+                key=lambda model: (
+                    ROUTER_PRIOR_FIRST_CHUNK_SECONDS if latency[model] is None else latency[model],
+                    fallback_rank.get(model, len(fallback_rank)),
+                ),
+            )
+            if explore and len(ordered) > 1 and random.random() < self.explore_rate:
+                # Now and then lead with another model, so a stale or unlucky estimate can recover
+                ordered.insert(0, ordered.pop(random.randrange(1, len(ordered))))
+        else:
+            ordered = [selected] + [model for model in self.fallback_models if model != selected]
+        healthy = [model for model in ordered if self.is_healthy(model)]
+        return healthy + [model for model in ordered if model not in healthy]
+
+    def backoff(self, attempt: int) -> float:
+        """Returns a jittered exponential delay before the given retry attempt."""
+        return min(ROUTER_BACKOFF_MAX, ROUTER_BACKOFF_BASE * 2 ** (attempt - 1)) * random.uniform(0.5, 1.5)
@@ -0,0 +1,222 @@
+"""Sharing Groq's per-minute budgets and identical upstream calls across sessions.
+
+Both pieces are process-wide: the app creates one of each with st.cache_resource and
+every session goes through them, so nothing here touches Streamlit.
+"""
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+# --- Configuration ---
+ADMISSION_MAX_WAIT = 60.0  # Seconds a request may wait in the queue
+ADMISSION_POLL_SECONDS = 0.25  # How often waiting requests recheck the budget
+ADMISSION_WINDOW_SECONDS = 60.0  # The budgets are per minute
+
+# --- Admission Control ---
+class AdmissionRejected(Exception):
+    """Raised when a request cannot be queued, or waited too long for its turn."""
+
+class AdmissionController:
+    """Keeps Groq calls within per-minute request and token budgets.
+
+    Waiting requests are queued per session and admitted round-robin across sessions,
+    so one busy kiosk cannot starve the others. When the queue is full, new requests
+    are refused at once rather than piling up.
+    """
+
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int, queue_limit: int):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.queue_limit = queue_limit
+        self._condition = threading.Condition()
+        self._grants = deque()  # [admitted_at, tokens] for calls admitted in the last minute
+        self._queues = OrderedDict()  # Session id -> waiting tickets; key order is the round-robin order
+        self._waiting = 0
+
+    def acquire(self, session: str, tokens: int, on_wait=None, timeout: float = ADMISSION_MAX_WAIT):
+        """Blocks until the call fits the budgets and it is this session's turn.
+
+        on_wait is called with the queue position (1 is next) whenever it changes.
+        Returns a grant to pass to settle() or cancel().
+        """
+        ticket = object()
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            if self._waiting >= self.queue_limit:
+                raise AdmissionRejected("The queue is full")
+            self._queues.setdefault(session, deque()).append(ticket)
+            self._waiting += 1
+        last_position = None
+        try:
+            while True:
+                with self._condition:
+                    self._expire()
+                    position = self._position(session, ticket)
+                    if position == 1 and self._fits(tokens):
+                        grant = [time.monotonic(), tokens]
+                        self._grants.append(grant)
+                        self._dequeue(session, ticket)
+                        self._condition.notify_all()
+                        return grant
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise AdmissionRejected("Timed out waiting in the queue")
+                    if on_wait is None or position == last_position:
+                        self._condition.wait(min(ADMISSION_POLL_SECONDS, remaining))
+                        continue
+                last_position = position
+                on_wait(position)  # Outside the lock; it may touch the UI
+        except BaseException:
+            with self._condition:
+                self._dequeue(session, ticket)
+                self._condition.notify_all()
+            raise
+
+    def settle(self, grant, tokens: int):
+        """Replaces a grant's token estimate with what the call actually used."""
+        with self._condition:
+            grant[1] = tokens
+            self._condition.notify_all()
+
+    def cancel(self, grant):
+        """Returns a grant's budget when the call was never made."""
+        with self._condition:
+            try:
+                self._grants.remove(grant)
+            except ValueError:
+                pass
+            self._condition.notify_all()
+
+    def release(self, grant, sent_tokens: int):
+        """Settles a failed call at the tokens that reached upstream, or cancels it if none did.
+
+        A failed attempt would otherwise hold its whole estimate for a minute while the
+        caller fails over and asks for another grant.
+        """
+        if sent_tokens:
+            self.settle(grant, sent_tokens)
+        else:
+            self.cancel(grant)
+
+    def _expire(self):
+        cutoff = time.monotonic() - ADMISSION_WINDOW_SECONDS
+        while self._grants and self._grants[0][0] < cutoff:
+            self._grants.popleft()
+
+    def _fits(self, tokens: int) -> bool:
+        if len(self._grants) >= self.requests_per_minute:
+            return False
+        used = sum(grant[1] for grant in self._grants)
+        return not self._grants or used + tokens <= self.tokens_per_minute  # A lone oversized call may still go
+
+    def _position(self, session: str, ticket) -> int:
+        """Counts the tickets served before this one under round-robin, plus one."""
+        depth = self._queues[session].index(ticket)
+        ahead = depth
+        before = True
+        for other, tickets in self._queues.items():
+            if other == session:
+                before = False
+                continue
+            ahead += min(len(tickets), depth + 1 if before else depth)
+        return ahead + 1
+
+    def _dequeue(self, session: str, ticket):
+        tickets = self._queues.get(session)
+        if tickets is None or ticket not in tickets:
+            return
+        tickets.remove(ticket)
+        self._waiting -= 1
+        if tickets:
+            self._queues.move_to_end(session)  # This session goes to the back of the rotation
+        else:
+            del self._queues[session]
+
+# --- Request Coalescing ---
+class _Flight:
+    """One upstream reply, shared by every session that asked for it."""
+
+    def __init__(self):
+        self.chunks = []
+        self.done = False
+        self.error = None
+        self.condition = threading.Condition()
+
+class SingleFlight:
+    """Makes one upstream call per distinct request, however many sessions ask at once.
+
+    The first caller for a request becomes its leader and must launch() or abandon() it;
+    this lets the leader wait for admission before anything goes upstream, while later
+    callers already wait on the same flight. A worker thread drives the upstream stream,
+    so the leader can rerun or leave without cutting off the others. Each subscriber
+    replays the chunks produced so far, then follows the live tail.
+    """
+
+    def __init__(self, max_workers: int, thread_name_prefix: str = "carney-flight"):
+        self._flights = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=thread_name_prefix)
+
+    def subscribe(self, key: str):
+        """Returns a chunk iterator for the request and whether this caller is its leader."""
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+        return self._follow(flight), leader
+
+    def launch(self, key: str, start):
+        """Starts the leader's request; start is called on a worker thread and yields chunks."""
+        with self._lock:
+            flight = self._flights[key]
+        self._executor.submit(self._run, key, flight, start)
+
+    def abandon(self, key: str, error: Exception):
+        """Ends the leader's request without starting it; every subscriber gets the error."""
+        with self._lock:
+            flight = self._flights.get(key)
+        if flight is not None:
+            self._finish(key, flight, error)
+
+    def in_flight(self, key: str) -> bool:
+        with self._lock:
+            return key in self._flights
+
+    def _run(self, key: str, flight: _Flight, start):
+        error = None
+        try:
+            for chunk in start():
+                with flight.condition:
+                    flight.chunks.append(chunk)
+                    flight.condition.notify_all()
+        except Exception as e:
+            error = e
+        finally:
+            self._finish(key, flight, error)
+
+    def _finish(self, key: str, flight: _Flight, error):
+        # Later identical requests are served by the response cache, or start afresh
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+        with flight.condition:
+            flight.error = error
+            flight.done = True
+            flight.condition.notify_all()
+
+    def _follow(self, flight: _Flight):
+        index = 0
+        while True:
+            with flight.condition:
+                while index == len(flight.chunks) and not flight.done:
+                    flight.condition.wait()
+                pending = flight.chunks[index:]
+                index += len(pending)
+                finished = flight.done and index == len(flight.chunks)
+            yield from pending
+            if finished:
+                if flight.error is not None:
+                    raise flight.error
+                return
@@ -0,0 +1,38 @@
+"""Cutting a streamed reply into sentences that can be spoken while the rest arrives.
+
+Only text handling lives here; synthesis and playback stay with the app.
+"""
+import re
+
+# --- Configuration ---
+SENTENCE_MIN_CHARS = 24  # Shorter fragments are spoken together with the next sentence
+SENTENCE_END = re.compile(r"[.!?]+[\"')\]]*\s+")
+
+# --- Sentences ---
+class SentenceSplitter:
+    """Cuts streamed text into sentences as soon as each one is complete."""
+
+    def __init__(self, min_chars: int = SENTENCE_MIN_CHARS):
+        self.min_chars = min_chars
+        self._buffer = ""
+
+    def feed(self, text: str) -> list:
+        """Adds streamed text and returns the sentences it completed."""
+        self._buffer += text
+        sentences = []
+        start = 0
+        for match in SENTENCE_END.finditer(self._buffer):
+            if match.end() - start >= self.min_chars:
+                sentences.append(self._buffer[start:match.end()].strip())
+                start = match.end()
+        self._buffer = self._buffer[start:]
+        return sentences
+
+    def flush(self) -> list:
+        """Returns whatever text is left once the stream has ended."""
+        rest, self._buffer = self._buffer.strip(), ""
+        return [rest] if rest else []
+
+def speakable(text: str) -> str:
+    """Strips Markdown markup that would otherwise be read aloud."""
+    return re.sub(r"[*_#`>|]+", "", text).strip()
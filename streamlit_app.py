@@ -1,19 +1,48 @@
 import streamlit as st
-from groq import Groq
+import asyncio
+import base64
 import random
+import re
+import statistics
+import itertools
+import functools
 import os
-import base64
+import queue
 import time
+import json
+import hashlib
+import threading
+import uuid
+import wave
+import sqlite3
+import logging
+from logging.handlers import RotatingFileHandler
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from io import BytesIO
+from caching import LRUCache, ResponseCache, replay_cached_response, response_cache_key
+from conversations import ConversationStore
+from persona import (
+    APP_NAME, APP_TAGLINE, DEFAULT_MODEL_INDEX, DEFAULT_MAX_TOKENS, DEFAULT_TEMPERATURE, QUICK_PROMPTS,
+    RETRIEVAL_TOP_K, SYSTEM_MESSAGE, SYSTEM_PROMPT_TOKENS, _get_system_prompt, models, estimate_tokens,
+    build_context, format_reference_notes, recall_questions,
+)
+from rendering import StreamRenderer
+from routing import AUTO_MODEL, ROUTER_MAX_ATTEMPTS, ModelRouter
+from scheduling import AdmissionController, AdmissionRejected, SingleFlight
+from speech import SentenceSplitter, speakable
+from styles import THEME_CSS, WELCOME_HTML
+
+# The Groq SDK, httpx, NumPy and Pillow are imported where first needed, not here, so a
+# cold server draws its first page without waiting on them.
 
 # --- Configuration ---
 PAGE_TITLE = "African American Civil War Memorial Museum"
 PAGE_ICON = "🎖️"
-DEFAULT_MODEL_INDEX = 1  
-APP_NAME = "Sergeant Carney"
-APP_TAGLINE = "A Conversation with a Civil War Hero"
 IMAGE_PATH = os.path.join("images", "max1200.jpg")  # Adjust this path to your image file
 IMAGE_CAPTION = "Sergeant William Harvey Carney, 54th Massachusetts Volunteer Infantry"
+IMAGE_WIDTH = 300  # Display width; the served copy is resized to twice this for sharp high-DPI screens
 
 # Loading messages for historical immersion
 LOADING_MESSAGES = [
@@ -24,206 +53,662 @@ LOADING_MESSAGES = [
     "Weaving words with care... 🔗",
 ]
 
-# --- System Prompt with 19th-Century Language ---
-def _get_system_prompt() -> str:
-    """Defines the personality and tone of Sergeant Carney using period-appropriate language."""
-    return """Thou art Sergeant William Harvey Carney, a man of the 54th Massachusetts Volunteer Infantry. 
-    Born a bondsman in Norfolk, Virginia, in the year of our Lord 1840, thou didst flee the yoke of slavery by the secret paths of the Underground Railroad, seeking liberty in the North. 
-    In the year 1863, on the eighteenth day of July, thou didst stand with thy comrades in arms afore Fort Wagner in South Carolina, bearing the colors of the Union with valor. 
-    Speak thou with the dignity of a freedman, the courage of a soldier, and the solemn duty of one who hath seen bondage and battle. 
-    Tell of thy deeds and the doings of the 54th Massachusetts with truth, as one who hath lived it. 
-    Use the tongue of the mid-19th century, with words and ways of speech common to that time, shunning all modern phrases and things unknown in the 1860s. 
-    When it be fitting, recount the trials of thy brethren, men of color in the Union ranks, and the great worth of their service to the cause of freedom."""
+# Said in place of a reply when no model could give one
+REPLY_FAILED_MESSAGE = "I crave thy pardon haha, for I cannot speak now. Pray, try once more friend."
+
+# Groq connection pool, shared by every session in the server process
+GROQ_POOL_SIZE = int(os.environ.get("CARNEY_POOL_SIZE", "20"))  # Concurrent connections to the API
+GROQ_KEEPALIVE_SECONDS = float(os.environ.get("CARNEY_KEEPALIVE_SECONDS", "60"))  # How long idle connections stay open for reuse
+GROQ_CONNECT_TIMEOUT = float(os.environ.get("CARNEY_CONNECT_TIMEOUT", "5"))
+GROQ_READ_TIMEOUT = float(os.environ.get("CARNEY_READ_TIMEOUT", "60"))
+GROQ_MAX_RETRIES = 2
+
+# Streaming render throttling; set both to 0 to redraw on every chunk
+RENDER_FLUSH_INTERVAL = float(os.environ.get("CARNEY_RENDER_INTERVAL", "0.05"))  # Seconds between placeholder redraws while a reply streams
+RENDER_FLUSH_CHARS = int(os.environ.get("CARNEY_RENDER_CHARS", "200"))  # Redraw sooner once this much new text has arrived
+
+# Model routing and failover
+FALLBACK_MODELS = ["llama-3.2-1b-preview", "Llama3-8b-8192"]  # Fast models to fail over to, in order
+
+# Model comparison mode
+COMPARE_DEFAULT_MODELS = 3  # How many models are preselected for comparison
+COMPARE_HISTORY_LIMIT = 200  # Per-session cap on remembered comparison results
+
+# Instrumentation; everything below is a no-op unless CARNEY_METRICS=1
+METRICS_ENABLED = os.environ.get("CARNEY_METRICS", "0") == "1"
+METRICS_PORT = int(os.environ.get("CARNEY_METRICS_PORT", "0"))  # Serve Prometheus text at /metrics; 0 disables
+METRICS_JSONL_PATH = os.environ.get("CARNEY_METRICS_JSONL", "")  # Rotating JSONL event log; empty disables
+METRICS_JSONL_MAX_BYTES = 10 * 1024 * 1024
+METRICS_JSONL_BACKUPS = 3
+METRICS_DEBUG_PANEL = os.environ.get("CARNEY_METRICS_PANEL", "0") == "1"  # Sidebar panel with live numbers
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)  # Seconds
+THROUGHPUT_BUCKETS = (10, 25, 50, 100, 250, 500, 1000, 2000)  # Tokens per second
+
+# Voice input
+TRANSCRIPTION_MODEL = "distil-whisper-large-v3-en"
+AUDIO_SAMPLE_RATE = 16000  # Whisper works at 16 kHz mono; anything more is wasted upload
+VAD_FRAME_SECONDS = 0.03
+VAD_THRESHOLD_RATIO = 0.05  # Frames quieter than this fraction of the loudest frame count as silence
+VAD_MIN_LEVEL = 0.01  # RMS below which a frame is always silence
+VAD_PADDING_SECONDS = 0.2  # Audio kept on either side of the voiced region
+TRANSCRIPTION_CACHE_ENTRIES = 512
+TRANSCRIPTION_CACHE_TTL = 24 * 60 * 60
+
+# Voice replies
+TTS_BACKEND = os.environ.get("CARNEY_TTS_BACKEND", "groq")  # "stub" speaks in tones, for offline testing
+TTS_MODEL = "playai-tts"
+TTS_VOICE = "Fritz-PlayAI"
+TTS_WORKERS = 4  # Sentences synthesized at once, across all sessions
+TTS_CACHE_ENTRIES = 256
+TTS_CACHE_TTL = 24 * 60 * 60
+TTS_CLIP_TIMEOUT = 30.0  # Seconds to wait for a sentence before skipping it
+TTS_REPLY_TIMEOUT = 60.0  # Seconds to wait for all the sentences still unspoken when a reply ends
+TTS_REQUESTS_PER_MINUTE = int(os.environ.get("CARNEY_TTS_REQUESTS_PER_MINUTE", "60"))  # Speech has its own budget, apart from chat
+TTS_TOKENS_PER_MINUTE = int(os.environ.get("CARNEY_TTS_TOKENS_PER_MINUTE", "10000"))
+
+# Admission control, shared by every session calling Groq
+ADMISSION_REQUESTS_PER_MINUTE = int(os.environ.get("CARNEY_REQUESTS_PER_MINUTE", "30"))
+ADMISSION_TOKENS_PER_MINUTE = int(os.environ.get("CARNEY_TOKENS_PER_MINUTE", "30000"))
+ADMISSION_QUEUE_LIMIT = int(os.environ.get("CARNEY_QUEUE_LIMIT", "50"))  # Waiting requests before new ones are refused
+
+# Request coalescing
+SINGLE_FLIGHT_WORKERS = GROQ_POOL_SIZE  # Threads driving upstream streams; one per pooled connection
+
+# Conversation store
+STORE_PATH = os.environ.get("CARNEY_STORE_PATH", os.path.join(".cache", "conversations.db"))
+HISTORY_WINDOW = 40  # Messages kept in session memory; older ones stay on disk
+HISTORY_PAGE_SIZE = 20  # Older messages fetched per "load earlier" click
+
+# Retrieval over the local source corpus
+RETRIEVAL_ENABLED = os.environ.get("CARNEY_RETRIEVAL", "1") == "1"
+RETRIEVAL_INDEX_DIR = os.environ.get("CARNEY_RETRIEVAL_INDEX")  # Defaults to .cache/retrieval beside retrieval.py
+RETRIEVAL_BUCKETS = (0.0005, 0.001, 0.002, 0.005, 0.01, 0.025, 0.05)  # Seconds
+
+# Response cache
+RESPONSE_CACHE_ENABLED = os.environ.get("CARNEY_RESPONSE_CACHE", "1") == "1"
+RESPONSE_CACHE_DIR = os.environ.get("CARNEY_RESPONSE_CACHE_DIR", os.path.join(".cache", "responses"))
+RESPONSE_CACHE_TTL = 24 * 60 * 60  # Seconds before a cached reply is regenerated
+RESPONSE_CACHE_MEMORY_ENTRIES = 256
+RESPONSE_CACHE_DISK_BYTES = 50 * 1024 * 1024
+RESPONSE_CACHE_WARMUP = os.environ.get("CARNEY_CACHE_WARMUP", "0") == "1"  # Pre-answer quick prompts at startup
+
+# --- Instrumentation ---
+class _NullTimer:
+    """Stands in for a timer when metrics are disabled."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+_NULL_TIMER = _NullTimer()
+
+class _Timer:
+    """Observes the wall time of a with-block into a histogram."""
+
+    def __init__(self, metrics, name: str, model: str, session: str):
+        self.metrics = metrics
+        self.name = name
+        self.model = model
+        self.session = session
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.metrics.observe(self.name, time.perf_counter() - self.started, self.model, self.session)
+        return False
+
+class Metrics:
+    """Process-wide counters and histograms, exported as Prometheus text and JSONL events.
+
+    Prometheus series are labelled by model only, to keep their cardinality bounded;
+    the JSONL events also carry the session id.
+    """
+
+    def __init__(self, enabled: bool, jsonl_path: str = ""):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+        self._events = None
+        if enabled and jsonl_path:
+            self._events = logging.getLogger(f"carney.metrics.{id(self)}")
+            self._events.propagate = False
+            self._events.setLevel(logging.INFO)
+            self._events.addHandler(RotatingFileHandler(jsonl_path, maxBytes=METRICS_JSONL_MAX_BYTES, backupCount=METRICS_JSONL_BACKUPS))
+
+    def inc(self, name: str, value: float = 1.0, model: str = "", session: str = ""):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[(name, model)] = self._counters.get((name, model), 0.0) + value
+        self._log(name, value, model, session)
+
+    def observe(self, name: str, value: float, model: str = "", session: str = "", buckets=LATENCY_BUCKETS):
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self._histograms.get((name, model))
+            if histogram is None:
+                histogram = self._histograms[(name, model)] = {"buckets": buckets, "counts": [0] * len(buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(histogram["buckets"]):
+                if value <= bound:
+                    histogram["counts"][i] += 1
+                    break
+            histogram["sum"] += value
+            histogram["count"] += 1
+        self._log(name, value, model, session)
+
+    def timer(self, name: str, model: str = "", session: str = ""):
+        """Returns a context manager timing its block, or a shared no-op when disabled."""
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, name, model, session)
+
+    def _log(self, name: str, value: float, model: str, session: str):
+        if self._events is not None:
+            self._events.info(json.dumps({"ts": time.time(), "metric": name, "value": value, "model": model, "session": session}))
+
+    def render_prometheus(self) -> str:
+        """Formats every series in the Prometheus text exposition format."""
+        def labels(model, le=None):
+            parts = [f'model="{_escape_label(model)}"'] if model else []
+            if le is not None:
+                parts.append(f'le="{le}"')
+            return "{" + ",".join(parts) + "}" if parts else ""
+
+        lines = []
+        with self._lock:
+            for name in sorted({name for name, _ in self._counters}):
+                lines.append(f"# TYPE {name} counter")
+                for (series, model), value in sorted(self._counters.items()):
+                    if series == name:
+                        lines.append(f"{name}{labels(model)} {value}")
+            for name in sorted({name for name, _ in self._histograms}):
+                lines.append(f"# TYPE {name} histogram")
+                for (series, model), histogram in sorted(self._histograms.items()):
+                    if series != name:
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(histogram["buckets"], histogram["counts"]):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{labels(model, bound)} {cumulative}")
+                    lines.append(f"{name}_bucket{labels(model, '+Inf')} {histogram['count']}")
+                    lines.append(f"{name}_sum{labels(model)} {histogram['sum']}")
+                    lines.append(f"{name}_count{labels(model)} {histogram['count']}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        """Returns one row per series for the sidebar debug panel."""
+        rows = []
+        with self._lock:
+            for (name, model), value in sorted(self._counters.items()):
+                rows.append({"Metric": name, "Model": model, "Count": value, "Mean": None, "~p95": None})
+            for (name, model), histogram in sorted(self._histograms.items()):
+                rows.append({
+                    "Metric": name,
+                    "Model": model,
+                    "Count": histogram["count"],
+                    "Mean": round(histogram["sum"] / histogram["count"], 4) if histogram["count"] else None,
+                    "~p95": _bucket_quantile(histogram, 0.95),
+                })
+        return rows
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _bucket_quantile(histogram, quantile: float):
+    """Approximates a quantile as the upper bound of the bucket that contains it."""
+    target = quantile * histogram["count"]
+    cumulative = 0
+    for bound, count in zip(histogram["buckets"], histogram["counts"]):
+        cumulative += count
+        if cumulative >= target and histogram["count"]:
+            return bound
+    return None
+
+def serve_metrics(metrics: Metrics, port: int):
+    """Serves the Prometheus text format at /metrics from a daemon thread."""
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = metrics.render_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # Scrapes would otherwise flood the Streamlit log
+
+    server = ThreadingHTTPServer(("0.0.0.0", port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+@st.cache_resource
+def get_metrics():
+    """Creates the process-wide metrics registry and its exporters, once per server process."""
+    metrics = Metrics(METRICS_ENABLED, METRICS_JSONL_PATH)
+    if METRICS_ENABLED and METRICS_PORT:
+        serve_metrics(metrics, METRICS_PORT)
+    return metrics
 
 # --- CSS Styling for Historical Theme ---
 def load_css(theme="light"):
     """Loads custom CSS for light and dark themes with a historical feel."""
-    if theme == "dark":
-        st.markdown("""
-        <style>
-            .stApp { background-color: #2c2f33; color: #ffffff !important; }
-            .stChatMessage { border-radius: 15px; padding: 1.5rem; margin: 1rem 0; box-shadow: 0 4px 12px rgba(0, 0, 0, 0.4); }
-            .stChatMessage.user { background: linear-gradient(135deg, #4B0082 0%, #8A2BE2 100%); margin-left: 15%; }
-            .stChatMessage.assistant { background: linear-gradient(135deg, #16213e 0%, #2d2d3a 100%); margin-right: 15%; border: 2px solid #4B0082; }
-            .stChatMessage * { color: #ffffff !important; }
-            div.stButton > button { background: linear-gradient(45deg, #4B0082, #8A2BE2); color: white !important; border-radius: 30px; padding: 1rem 2rem; font-size: 18px !important; border: none; }
-            .progress-message { color: #BA55D3; font-size: 18px !important; }
-            .welcome-card { padding: 2rem; background: linear-gradient(135deg, #2c2f33 0%, #16213e 100%); border-radius: 20px; box-shadow: 0 6px 12px rgba(0, 0, 0, 0.5); border: 2px solid #4B0082; }
-            .record-button { background: linear-gradient(45deg, #B22222, #FF0000) !important; }
-            .record-button:hover { background: linear-gradient(45deg, #FF0000, #B22222) !important; }
-            .recording { animation: pulse 1.5s infinite; }
-            @keyframes pulse {
-                0% { opacity: 1; }
-                50% { opacity: 0.5; }
-                100% { opacity: 1; }
-            }
-        </style>
-        """, unsafe_allow_html=True)
-    else:
-        st.markdown("""
-        <style>
-            .stApp { background-color: #f5f5dc; color: #000000 !important; }  /* Beige background for vintage feel */
-            .stChatMessage { border-radius: 15px; padding: 1.5rem; margin: 1rem 0; box-shadow: 0 4px 12px rgba(0, 0, 0, 0.15); }
-            .stChatMessage.user { background: linear-gradient(135deg, #E6E6FA 0%, #D8BFD8 100%); margin-left: 15%; }
-            .stChatMessage.assistant { background: linear-gradient(135deg, #F0F8FF 0%, #E6E6FA 100%); margin-right: 15%; border: 2px solid #D8BFD8; }
-            .stChatMessage * { color: #000000 !important; }
-            div.stButton > button { background: linear-gradient(45deg, #9370DB, #DA70D6); color: black !important; border-radius: 30px; padding: 1rem 2rem; font-size: 18px !important; border: none; }
-            .progress-message { color: #9370DB; font-size: 18px !important; }
-            .welcome-card { padding: 2rem; background: linear-gradient(135deg, #f5f5dc 0%, #e4e8ed 100%); border-radius: 20px; box-shadow: 0 6px 12px rgba(0, 0, 0, 0.15); border: 2px solid #D8BFD8; }
-            .record-button { background: linear-gradient(45deg, #8B0000, #CD5C5C) !important; }
-            .record-button:hover { background: linear-gradient(45deg, #CD5C5C, #8B0000) !important; }
-            .recording { animation: pulse 1.5s infinite; }
-            @keyframes pulse {
-                0% { opacity: 1; }
-                50% { opacity: 0.5; }
-                100% { opacity: 1; }
-            }
-        </style>
-        """, unsafe_allow_html=True)
+    st.markdown(THEME_CSS[theme], unsafe_allow_html=True)
+
+# --- Groq Client ---
+@st.cache_resource
+def get_groq_client(api_key: str):
+    """Creates a single Groq client whose connection pool is reused across reruns and sessions."""
+    from groq import Groq, DefaultHttpxClient
+    import httpx
+
+    http_client = DefaultHttpxClient(
+        limits=httpx.Limits(
+            max_connections=GROQ_POOL_SIZE,
+            max_keepalive_connections=GROQ_POOL_SIZE,
+            keepalive_expiry=GROQ_KEEPALIVE_SECONDS,
+        ),
+    )
+    return Groq(
+        api_key=api_key,
+        http_client=http_client,
+        timeout=httpx.Timeout(GROQ_READ_TIMEOUT, connect=GROQ_CONNECT_TIMEOUT),
+        max_retries=GROQ_MAX_RETRIES,
+    )
+
+@st.cache_resource
+def warm_groq_client(_client) -> bool:
+    """Opens a pooled connection with a cheap health check, once per server process."""
+    try:
+        _client.with_options(timeout=GROQ_CONNECT_TIMEOUT * 2, max_retries=0).models.list()
+        return True
+    except Exception:
+        return False  # Not fatal; the first real request will connect instead
+
+@st.cache_resource
+def start_client_warmup(api_key: str):
+    """Imports the SDK and opens a pooled connection in the background, once per server process."""
+    def warm():
+        with metrics.timer("carney_client_setup_seconds"):
+            warm_groq_client(get_groq_client(api_key))
+    thread = threading.Thread(target=warm, daemon=True, name="carney-client-warmup")
+    thread.start()
+    return thread
+
+def groq_client():
+    """Returns the shared Groq client.
+
+    If the warm-up thread is still building it, this waits on st.cache_resource's lock for
+    the client to exist, but not for the warm-up request, which may still be in flight.
+    """
+    return get_groq_client(st.secrets["GROQ_API_KEY"])
+
+# --- Admission Control ---
+@st.cache_resource
+def get_admission_controller():
+    """Creates the process-wide admission controller for Groq calls."""
+    return AdmissionController(ADMISSION_REQUESTS_PER_MINUTE, ADMISSION_TOKENS_PER_MINUTE, ADMISSION_QUEUE_LIMIT)
+
+def show_queue_position(placeholder):
+    """Returns a callback that tells the visitor their place in line."""
+    def on_wait(position: int):
+        placeholder.markdown(
+            f"<div class='progress-message'>Many visitors are calling upon me. Thou art number {position} in line... ⏳</div>",
+            unsafe_allow_html=True,
+        )
+    return on_wait
 
 # --- Audio Recording Functions ---
 def audio_recorder():
-    """Creates a custom audio recorder widget."""
-    st.markdown("""
-    <script>
-    const audioRecorder = {
-        audioChunks: [],
-        mediaRecorder: null,
-        stream: null,
-        
-        async startRecording() {
-            try {
-                this.stream = await navigator.mediaDevices.getUserMedia({ audio: true });
-                this.mediaRecorder = new MediaRecorder(this.stream);
-                this.audioChunks = [];
-                
-                this.mediaRecorder.ondataavailable = (e) => {
-                    if (e.data.size > 0) this.audioChunks.push(e.data);
-                };
-                
-                this.mediaRecorder.onstop = () => {
-                    const audioBlob = new Blob(this.audioChunks);
-                    const reader = new FileReader();
-                    reader.readAsDataURL(audioBlob);
-                    reader.onloadend = () => {
-                        const base64data = reader.result.split(',')[1];
-                        window.parent.postMessage({
-                            type: "audio-data",
-                            data: base64data
-                        }, "*");
-                    };
-                    this.stopStream();
-                };
-                
-                this.mediaRecorder.start();
-                const recordButton = document.getElementById('record-button');
-                recordButton.textContent = "⏹️ Stop Recording";
-                recordButton.classList.add("recording");
-            } catch (err) {
-                console.error("Error accessing microphone:", err);
-                window.parent.postMessage({
-                    type: "recording-error",
-                    error: err.message
-                }, "*");
-            }
-        },
-        
-        stopRecording() {
-            if (this.mediaRecorder && this.mediaRecorder.state !== 'inactive') {
-                this.mediaRecorder.stop();
-                const recordButton = document.getElementById('record-button');
-                recordButton.textContent = "🎤 Start Recording";
-                recordButton.classList.remove("recording");
-            }
-        },
-        
-        stopStream() {
-            if (this.stream) {
-                this.stream.getTracks().forEach(track => track.stop());
-            }
-        },
-        
-        toggleRecording() {
-            if (this.mediaRecorder && this.mediaRecorder.state === 'recording') {
-                this.stopRecording();
-            } else {
-                this.startRecording();
-            }
-        }
-    };
-    
-    // Create and insert record button
-    const recordButton = document.createElement('button');
-    recordButton.id = 'record-button';
-    recordButton.className = 'record-button';
-    recordButton.textContent = "🎤 Start Recording";
-    recordButton.style.padding = '10px 20px';
-    recordButton.style.borderRadius = '20px';
-    recordButton.style.margin = '10px 0';
-    recordButton.style.cursor = 'pointer';
-    recordButton.onclick = () => audioRecorder.toggleRecording();
-    
-    // Insert the button
-    document.currentScript.insertAdjacentElement('afterend', recordButton);
-    </script>
-    """, unsafe_allow_html=True)
-    
-    # Create a placeholder for receiving messages from JavaScript
-    audio_data = st.empty()
-    
-    # Listen for messages from JavaScript
-    st_js = """
-    <script>
-    window.addEventListener('message', function(event) {
-        if (event.data.type === 'audio-data') {
-            document.getElementById('audio-data').value = event.data.data;
-            document.getElementById('audio-form').submit();
-        } else if (event.data.type === 'recording-error') {
-            document.getElementById('recording-error').value = event.data.error;
-            document.getElementById('audio-form').submit();
-        }
-    });
-    </script>
-    <form id="audio-form" action="" target="_self" method="POST">
-        <input type="hidden" id="audio-data" name="audio_data">
-        <input type="hidden" id="recording-error" name="recording_error">
-    </form>
+    """Records a spoken question in the browser and returns its bytes.
+
+    The recording is uploaded as a binary file over the Streamlit websocket, so
+    there is no base64 inflation and no query-string size limit.
     """
-    st.markdown(st_js, unsafe_allow_html=True)
-    
-    # Handle form submission - UPDATED to use st.query_params instead of st.experimental_get_query_params
-    if 'audio_data' in st.query_params:
-        audio_data = st.query_params['audio_data']
-        return audio_data
-    
-    return None
+    recording = st.audio_input("🎤 Speak your question", key="voice_question")
+    return recording.getvalue() if recording is not None else None
+
+def _decode_wav(audio_bytes: bytes):
+    """Decodes PCM WAV into mono float samples in [-1, 1] and their sample rate, or None if unsupported."""
+    try:
+        with wave.open(BytesIO(audio_bytes)) as wav:
+            channels, width, rate = wav.getnchannels(), wav.getsampwidth(), wav.getframerate()
+            raw = wav.readframes(wav.getnframes())
+    except (wave.Error, EOFError):
+        return None
+    import numpy as np
+    if width == 1:
+        samples = (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    elif width == 2:
+        samples = np.frombuffer(raw, dtype="<i2").astype(np.float32) / 32768.0
+    elif width == 4:
+        samples = np.frombuffer(raw, dtype="<i4").astype(np.float32) / 2147483648.0
+    else:
+        return None
+    samples = samples[: len(samples) - len(samples) % channels]
+    return samples.reshape(-1, channels).mean(axis=1), rate
+
+def _resample(samples, rate: int, target_rate: int):
+    """Resamples mono audio, averaging whole-number decimation windows to limit aliasing."""
+    import numpy as np
+    if rate == target_rate or len(samples) == 0:
+        return samples
+    if rate % target_rate == 0:
+        factor = rate // target_rate
+        samples = samples[: len(samples) - len(samples) % factor]
+        return samples.reshape(-1, factor).mean(axis=1)
+    duration = len(samples) / rate
+    positions = np.linspace(0, len(samples) - 1, int(duration * target_rate))
+    return np.interp(positions, np.arange(len(samples)), samples).astype(np.float32)
+
+def _trim_silence(samples, rate: int):
+    """Trims leading and trailing silence by frame energy. Returns None if nothing was voiced."""
+    import numpy as np
+    frame = int(rate * VAD_FRAME_SECONDS)
+    frame_count = len(samples) // frame
+    if frame_count == 0:
+        return None
+    energy = np.sqrt(np.mean(samples[: frame_count * frame].reshape(frame_count, frame) ** 2, axis=1))
+    threshold = max(VAD_MIN_LEVEL, float(energy.max()) * VAD_THRESHOLD_RATIO)
+    voiced = np.flatnonzero(energy > threshold)
+    if len(voiced) == 0:
+        return None
+    padding = int(VAD_PADDING_SECONDS * rate)
+    start = max(0, voiced[0] * frame - padding)
+    end = min(len(samples), (voiced[-1] + 1) * frame + padding)
+    return samples[start:end]
 
-def process_audio(audio_data):
+def _encode_audio(samples, rate: int):
+    """Encodes mono audio as FLAC when soundfile is installed, otherwise as 16-bit PCM WAV."""
+    import numpy as np
+    try:
+        import soundfile  # Optional: enables compact FLAC uploads for voice questions
+    except ImportError:
+        soundfile = None
+    pcm = (np.clip(samples, -1.0, 1.0) * 32767).astype("<i2")
+    buffer = BytesIO()
+    if soundfile is not None:
+        soundfile.write(buffer, pcm, rate, format="FLAC")
+        return "speech.flac", buffer.getvalue()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        wav.writeframes(pcm.tobytes())
+    return "speech.wav", buffer.getvalue()
+
+def prepare_audio(audio_bytes: bytes):
+    """Downmixes, resamples to 16 kHz, trims silence and re-encodes a recording for upload.
+
+    Returns a (filename, bytes) pair, the original bytes if the format is not PCM WAV,
+    or None if the recording holds only silence.
+    """
+    decoded = _decode_wav(audio_bytes)
+    if decoded is None:
+        return "speech.wav", audio_bytes  # Let Whisper decode formats we cannot
+    samples, rate = decoded
+    samples = _trim_silence(_resample(samples, rate, AUDIO_SAMPLE_RATE), AUDIO_SAMPLE_RATE)
+    if samples is None:
+        return None
+    return _encode_audio(samples, AUDIO_SAMPLE_RATE)
+
+@st.cache_resource
+def get_transcription_cache():
+    """Creates the process-wide cache of transcriptions keyed by audio content hash."""
+    return LRUCache(TRANSCRIPTION_CACHE_ENTRIES, TRANSCRIPTION_CACHE_TTL)
+
+def process_audio(audio_bytes: bytes, audio_hash: str):
     """Process audio data and transcribe using Groq's distil-whisper-large-v3-en model."""
+    transcription_cache = get_transcription_cache()
+    cached = transcription_cache.get(audio_hash)
+    if cached is not None:
+        metrics.inc("carney_transcription_cache_hits_total", session=st.session_state.session_id)
+        return cached
     try:
-        # Convert base64 to bytes
-        audio_bytes = base64.b64decode(audio_data)
+        # Shrink the upload before it leaves the server
+        with metrics.timer("carney_audio_decode_seconds", session=st.session_state.session_id):
+            prepared = prepare_audio(audio_bytes)
+        if prepared is None:
+            st.warning("I heard naught but silence. Pray, speak once more.")
+            return None
+        filename, upload = prepared
+        metrics.inc("carney_audio_upload_bytes_total", len(upload), session=st.session_state.session_id)
         
-        # Create a client for the Whisper API
-        client = Groq(api_key=st.secrets["GROQ_API_KEY"])
+        # Reuse the pooled client for the Whisper API, within the shared request budget
+        client = groq_client()
+        try:
+            get_admission_controller().acquire(st.session_state.session_id, 0)
+        except AdmissionRejected:
+            st.warning("The camp is overfull with visitors just now. Pray, speak again in a moment.")
+            return None
         
         # Get transcription from Groq's distil-whisper-large-v3-en
-        transcription = client.audio.transcriptions.create(
-            model="distil-whisper-large-v3-en",
-            file=("speech.wav", BytesIO(audio_bytes)),
-        )
+        with metrics.timer("carney_audio_transcribe_seconds", TRANSCRIPTION_MODEL, st.session_state.session_id):
+            transcription = client.audio.transcriptions.create(
+                model=TRANSCRIPTION_MODEL,
+                file=(filename, BytesIO(upload)),
+            )
         
+        transcription_cache.set(audio_hash, transcription.text)
         return transcription.text
     except Exception as e:
         st.error(f"Error transcribing audio: {e}")
         return None
 
+# --- Voice Replies ---
+class StubSpeechBackend:
+    """Offline backend that renders each sentence as a soft tone, one beat per word."""
+
+    name = "stub"
+    sample_rate = 16000
+
+    def synthesize(self, text: str, session: str) -> bytes:
+        import numpy as np
+        seconds = min(0.15 * len(text.split()), 10.0)
+        t = np.arange(int(self.sample_rate * seconds)) / self.sample_rate
+        samples = (0.1 * np.sin(2 * np.pi * 220 * t) * 32767).astype(np.int16)
+        buffer = BytesIO()
+        with wave.open(buffer, "wb") as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(self.sample_rate)
+            wav.writeframes(samples.tobytes())
+        return buffer.getvalue()
+
+class GroqSpeechBackend:
+    """Speaks through Groq's text-to-speech endpoint, within the speech budget."""
+
+    name = "groq"
+
+    def __init__(self, client):
+        self.client = client
+
+    def synthesize(self, text: str, session: str) -> bytes:
+        # Never wait longer than the reply will wait for this clip
+        get_speech_admission_controller().acquire(session, estimate_tokens(text), timeout=TTS_CLIP_TIMEOUT)
+        response = self.client.audio.speech.create(model=TTS_MODEL, voice=TTS_VOICE, input=text, response_format="wav")
+        return response.read()
+
+class SpeechSynthesizer:
+    """Synthesizes sentences on a shared worker pool, caching clips by text hash.
+
+    Any object with a name and a synthesize(text, session) method returning WAV bytes
+    can serve as the backend.
+    """
+
+    def __init__(self, backend, workers: int = TTS_WORKERS):
+        self.backend = backend
+        self.cache = LRUCache(TTS_CACHE_ENTRIES, TTS_CACHE_TTL)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="carney-tts")
+
+    def submit(self, text: str, session: str) -> Future:
+        """Starts synthesizing a sentence and returns a future for its clip."""
+        key = hashlib.sha256(f"{self.backend.name}\0{TTS_VOICE}\0{text}".encode("utf-8")).hexdigest()
+        clip = self.cache.get(key)
+        if clip is not None:
+            metrics.inc("carney_tts_cache_hits_total", session=session)
+            future = Future()
+            future.set_result(clip)
+            return future
+        return self._executor.submit(self._synthesize, key, text, session)
+
+    def _synthesize(self, key: str, text: str, session: str) -> bytes:
+        with metrics.timer("carney_tts_seconds", self.backend.name, session):
+            clip = self.backend.synthesize(text, session)
+        self.cache.set(key, clip)
+        return clip
+
+@st.cache_resource
+def get_speech_admission_controller():
+    """Creates the process-wide admission controller for speech calls, apart from chat."""
+    return AdmissionController(TTS_REQUESTS_PER_MINUTE, TTS_TOKENS_PER_MINUTE, ADMISSION_QUEUE_LIMIT)
+
+@st.cache_resource
+def get_speech_synthesizer(_client):
+    """Creates the process-wide speech synthesizer for the configured backend."""
+    backend = StubSpeechBackend() if TTS_BACKEND == "stub" else GroqSpeechBackend(_client)
+    return SpeechSynthesizer(backend)
+
+# Each clip joins a promise chain on the page, so sentences play one after another
+# even though every clip arrives in its own component frame.
+VOICE_CLIP_HTML = """
+<script>
+const page = window.parent;
+page.carneyVoice = (page.carneyVoice || Promise.resolve()).then(() => new Promise((done) => {
+    const clip = new page.Audio("data:audio/wav;base64,%s");
+    clip.onended = done;
+    clip.onerror = done;
+    clip.play().catch(done);
+}));
+</script>
+"""
+
+class VoiceReply:
+    """Speaks a streamed reply sentence by sentence while the rest is still arriving."""
+
+    def __init__(self, synthesizer: SpeechSynthesizer, container, session: str):
+        self.synthesizer = synthesizer
+        self.container = container
+        self.session = session
+        self.splitter = SentenceSplitter()
+        self._pending = deque()  # Clip futures in reply order
+
+    def feed(self, text: str):
+        """Adds streamed text, queueing finished sentences and playing any clips ready in order."""
+        for sentence in self.splitter.feed(text):
+            self._submit(sentence)
+        while self._pending and self._pending[0].done():
+            self._play(self._pending.popleft())
+
+    def finish(self):
+        """Queues the last sentence and plays the remaining clips in order, within one deadline."""
+        for sentence in self.splitter.flush():
+            self._submit(sentence)
+        deadline = time.monotonic() + TTS_REPLY_TIMEOUT
+        while self._pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            self._play(self._pending.popleft(), min(remaining, TTS_CLIP_TIMEOUT))
+        if self._pending:
+            metrics.inc("carney_tts_errors_total", len(self._pending), session=self.session)
+            logging.getLogger(__name__).warning("Gave up on %d unspoken sentences", len(self._pending))
+        while self._pending:
+            self._pending.popleft().cancel()  # Clips not yet started are never synthesized
+
+    def _submit(self, sentence: str):
+        text = speakable(sentence)
+        if text:
+            self._pending.append(self.synthesizer.submit(text, self.session))
+
+    def _play(self, future: Future, timeout: float = TTS_CLIP_TIMEOUT):
+        try:
+            clip = future.result(timeout=timeout)
+        except Exception as e:
+            future.cancel()
+            metrics.inc("carney_tts_errors_total", session=self.session)
+            logging.getLogger(__name__).warning("Could not synthesize sentence: %s", e)  # The text is still shown
+            return
+        html = VOICE_CLIP_HTML % base64.b64encode(clip).decode("ascii")
+        with self.container:
+            if hasattr(st, "iframe"):
+                st.iframe(html, height=1)
+            else:  # Streamlit releases before st.iframe
+                import streamlit.components.v1 as components
+                components.html(html, height=0)
+
+# --- Source Retrieval ---
+@st.cache_resource
+def get_retrieval_index():
+    """Loads the memory-mapped source index once per process, building it if it is stale."""
+    if not RETRIEVAL_ENABLED:
+        return None
+    try:
+        import retrieval
+        index = retrieval.load_index(retrieval.CORPUS_DIR, RETRIEVAL_INDEX_DIR or retrieval.INDEX_DIR)
+    except Exception as e:
+        logging.getLogger(__name__).warning("Source retrieval is off: %s", e)  # Answers fall back on the persona alone
+        return None
+    if index is None:
+        logging.getLogger(__name__).warning("Source retrieval is off: no corpus files in %s", retrieval.CORPUS_DIR)
+    return index
+
+def reference_notes(question: str, session: str = "") -> str:
+    """Returns the source passages most relevant to a question, within the token budget."""
+    index = get_retrieval_index()
+    if index is None:
+        return ""
+    started = time.perf_counter()
+    passages = index.search(question, RETRIEVAL_TOP_K)
+    metrics.observe("carney_retrieval_seconds", time.perf_counter() - started, session=session, buckets=RETRIEVAL_BUCKETS)
+    return format_reference_notes(passages)
+
+# --- Conversation Store ---
+@st.cache_resource
+def get_conversation_store():
+    """Opens the conversation store once per server process."""
+    return ConversationStore(STORE_PATH)
+
+def start_conversation(conversation_id=None):
+    """Starts a new conversation, or resumes a stored one with only its latest messages in memory."""
+    store = get_conversation_store()
+    if conversation_id is None or not re.fullmatch(r"[0-9a-f]{32}", conversation_id):
+        conversation_id = uuid.uuid4().hex
+    stored_count = store.count(conversation_id)
+    recent = store.load(conversation_id, stored_count - HISTORY_WINDOW + 1, stored_count) if stored_count else []
+    st.session_state.conversation_id = conversation_id
+    st.session_state.stored_count = stored_count
+    st.session_state.earlier_pages = 0
+    st.session_state.messages = [(role, content) for role, content in recent]
+    st.session_state.token_counts = [estimate_tokens(content) for _, content in recent]
+    # Questions from before the window still reach the model as the "earlier" note
+    older_count = stored_count - len(recent)
+    st.session_state.earlier_questions = recall_questions(store.questions(conversation_id, older_count)) if older_count > 0 else ""
+    st.query_params["c"] = conversation_id  # Refreshing the page resumes this conversation
+    if recent:
+        st.session_state.show_welcome = False
+
+def earlier_message_count() -> int:
+    """Counts stored messages older than those held in session memory."""
+    return max(0, st.session_state.stored_count - len(st.session_state.messages))
+
 # --- Page Setup ---
+rerun_started = time.perf_counter()
 st.set_page_config(page_icon=PAGE_ICON, layout="wide", page_title=PAGE_TITLE, initial_sidebar_state="expanded")
+metrics = get_metrics()
 
 # --- Session State Initialization ---
-if "messages" not in st.session_state:
-    st.session_state.messages = [{"role": "system", "content": _get_system_prompt()}]
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex[:12]
 if "selected_model" not in st.session_state:
     st.session_state.selected_model = None
 if "chat_counter" not in st.session_state:
@@ -234,8 +719,14 @@ if "theme" not in st.session_state:
     st.session_state.theme = "light"
 if "is_recording" not in st.session_state:
     st.session_state.is_recording = False
-if "audio_data" not in st.session_state:
-    st.session_state.audio_data = None
+if "last_audio_hash" not in st.session_state:
+    st.session_state.last_audio_hash = None
+if "pending_prompt" not in st.session_state:
+    st.session_state.pending_prompt = None
+if "compare_results" not in st.session_state:
+    st.session_state.compare_results = []
+if "conversation_id" not in st.session_state:
+    start_conversation(st.query_params.get("c"))
 
 # Apply CSS
 load_css(st.session_state.theme)
@@ -246,8 +737,8 @@ def icon(emoji: str):
     st.write(f'<span style="font-size: 80px; line-height: 1">{emoji}</span>', unsafe_allow_html=True)
 
 def clear_chat_history():
-    """Resets the chat history."""
-    st.session_state.messages = [{"role": "system", "content": _get_system_prompt()}]
+    """Resets the chat history by starting a new conversation."""
+    start_conversation()
     st.session_state.chat_counter = 0
     st.session_state.show_welcome = True
 
@@ -255,40 +746,326 @@ def dismiss_welcome():
     """Hides the welcome message."""
     st.session_state.show_welcome = False
 
+def add_message(role: str, content: str):
+    """Appends a message to the chat history and the store, counting its tokens once."""
+    st.session_state.messages.append((role, content))
+    st.session_state.token_counts.append(estimate_tokens(content))
+    try:
+        get_conversation_store().append(st.session_state.conversation_id, role, content)
+        st.session_state.stored_count += 1
+    except sqlite3.Error as e:
+        logging.getLogger(__name__).warning("Could not save message: %s", e)  # The chat goes on in memory
+
+    # Keep session memory bounded; older messages can be paged back in from the store, and
+    # their questions stay in the note that build_context puts ahead of the kept turns
+    excess = len(st.session_state.messages) - HISTORY_WINDOW
+    if excess > 0:
+        st.session_state.earlier_questions = recall_questions(
+            (content for role, content in st.session_state.messages[:excess] if role == "user"),
+            st.session_state.earlier_questions,
+        )
+        del st.session_state.messages[:excess]
+        del st.session_state.token_counts[:excess]
+
+def request_messages():
+    """Expands the session's (role, content) history into API messages behind the shared system prompt.
+
+    Sessions hold only compact tuples; the system prompt and its token count are kept once
+    per process. Returns the messages and their token counts.
+    """
+    messages = [SYSTEM_MESSAGE]
+    messages.extend({"role": role, "content": content} for role, content in st.session_state.messages)
+    return messages, [SYSTEM_PROMPT_TOKENS] + st.session_state.token_counts
+
+def load_earlier_page():
+    """Shows one more page of stored messages above the chat."""
+    st.session_state.earlier_pages += 1
+
 def use_quick_prompt(prompt):
-    """Handles quick prompt selection."""
+    """Handles quick prompt selection by queueing it as the next question."""
     st.session_state.show_welcome = False
-    st.session_state.messages.append({"role": "user", "content": prompt})
-    st.session_state.chat_counter += 1
+    st.session_state.pending_prompt = prompt
     return prompt
 
-# --- Updated Model Options ---
-models = {
-    "llama-3.3-70b-versatile": {"name": "Llama-3.3-70b-Versatile", "tokens": 8192, "developer": "Meta", "description": "Latest Llama model for versatile, detailed medical responses"},
-    "Llama3-8b-8192": {"name": "Llama3-8b-8192", "tokens": 8192, "developer": "Meta", "description": "Efficient Llama model for fast, accurate medical insights"},
-    "mistral-saba-24b": {"name": "Mistral-Saba-24b", "tokens": 32768, "developer": "Mistral", "description": "Specialized model with large context for in-depth narratives"},
-    "mixtral-8x22b-instruct": {"name": "Mixtral-8x22b-Instruct", "tokens": 65536, "developer": "Mistral", "description": "Advanced Mixtral for complex medical analysis"},
-    "gemma-2-27b-it": {"name": "Gemma-2-27b-IT", "tokens": 8192, "developer": "Google", "description": "Updated Gemma model for general-purpose medical dialogue"},
-    "llama-3.2-1b-preview": {"name": "Llama-3.2-1b-Preview", "tokens": 4096, "developer": "Meta", "description": "Lightweight Llama model for quick responses and basic assistance"},
+def generate_chat_responses(chat_completion):
+    """Generates streaming responses from the Groq API."""
+    for chunk in chat_completion:
+        if chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+def record_reply_metrics(model: str, session: str, started: float, first_chunk_at, text: str, renderer):
+    """Records latency, throughput and rendering cost of one live reply."""
+    if not metrics.enabled:
+        return
+    finished = time.perf_counter()
+    metrics.inc("carney_chat_requests_total", model=model, session=session)
+    metrics.observe("carney_chat_latency_seconds", finished - started, model, session)
+    if first_chunk_at is not None:
+        metrics.observe("carney_chat_first_chunk_seconds", first_chunk_at - started, model, session)
+        if finished > first_chunk_at:
+            tokens_per_second = estimate_tokens(text) / (finished - first_chunk_at)
+            metrics.observe("carney_chat_tokens_per_second", tokens_per_second, model, session, THROUGHPUT_BUCKETS)
+    metrics.inc("carney_render_flushes_total", renderer.flushes, model, session)
+    metrics.inc("carney_render_chars_total", renderer.chars_sent, model, session)
+
+# --- Model Options ---
+AUTO_MODEL_INFO = {
+    "name": "Auto (fastest healthy model)",
+    "tokens": min(info["tokens"] for info in models.values()),  # Any model it picks must fit the request
+    "developer": "Groq routing",
+    "description": "Picks whichever model is answering fastest and is not rate limited",
 }
 
+def model_label(model_id: str) -> str:
+    """Returns the display name of a model or of the automatic routing entry."""
+    return AUTO_MODEL_INFO["name"] if model_id == AUTO_MODEL else models[model_id]["name"]
+
+# --- Model Routing ---
+@st.cache_resource
+def get_model_router():
+    """Creates the process-wide model router, so every session learns from every request."""
+    return ModelRouter(list(models.keys()), FALLBACK_MODELS)
+
+# --- Response Cache ---
+@st.cache_resource
+def get_response_cache():
+    """Creates the process-wide response cache shared by every session."""
+    return ResponseCache(RESPONSE_CACHE_DIR, RESPONSE_CACHE_TTL, RESPONSE_CACHE_MEMORY_ENTRIES, RESPONSE_CACHE_DISK_BYTES)
+
+def warm_quick_prompts(cache, client):
+    """Answers each quick prompt with the default settings so first clicks hit the cache."""
+    model = list(models.keys())[DEFAULT_MODEL_INDEX]
+    context_limit = models[model]["tokens"]
+    max_tokens = min(DEFAULT_MAX_TOKENS, context_limit)
+    system = {"role": "system", "content": _get_system_prompt()}
+    for prompt in QUICK_PROMPTS:
+        messages = [system, {"role": "user", "content": prompt}]
+        token_counts = [estimate_tokens(m["content"]) for m in messages]
+        context, reply_tokens = build_context(messages, token_counts, context_limit, max_tokens, reference_notes(prompt))
+        key = response_cache_key(model, context, DEFAULT_TEMPERATURE, reply_tokens)
+        if cache.memory.get(key) is not None or cache.disk.get(key) is not None:
+            continue
+        try:
+            get_admission_controller().acquire("warmup", sum(estimate_tokens(m["content"]) for m in context) + reply_tokens)
+            chat_completion = client.chat.completions.create(
+                model=model,
+                messages=context,
+                max_tokens=reply_tokens,
+                temperature=DEFAULT_TEMPERATURE,
+                stream=True
+            )
+            cache.set(key, list(generate_chat_responses(chat_completion)))
+        except Exception:
+            return  # Warm-up is best effort; live requests will fill the cache instead
+
+@st.cache_resource
+def start_cache_warmup(_client):
+    """Starts the quick-prompt warm-up once per server process."""
+    thread = threading.Thread(target=warm_quick_prompts, args=(get_response_cache(), _client), daemon=True)
+    thread.start()
+    return thread
+
+# --- Model Comparison ---
+def comparison_request(model: str, question: str, notes: str, max_tokens: int):
+    """Builds the messages and reply budget for asking one model the comparison question."""
+    messages = [SYSTEM_MESSAGE, {"role": "user", "content": question}]
+    token_counts = [SYSTEM_PROMPT_TOKENS, estimate_tokens(question)]
+    return build_context(messages, token_counts, models[model]["tokens"], max_tokens, notes)
+
+@st.cache_resource
+def get_async_groq_client(api_key: str):
+    """Starts an event loop thread with one AsyncGroq client on it, once per server process.
+
+    Comparisons run on this loop, so they share one connection pool instead of opening
+    and closing a client for every question.
+    """
+    from groq import AsyncGroq, DefaultAsyncHttpxClient
+    import httpx
+
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True, name="carney-compare-loop").start()
+    http_client = DefaultAsyncHttpxClient(
+        limits=httpx.Limits(
+            max_connections=GROQ_POOL_SIZE,
+            max_keepalive_connections=GROQ_POOL_SIZE,
+            keepalive_expiry=GROQ_KEEPALIVE_SECONDS,
+        ),
+    )
+    client = AsyncGroq(
+        api_key=api_key,
+        http_client=http_client,
+        timeout=httpx.Timeout(GROQ_READ_TIMEOUT, connect=GROQ_CONNECT_TIMEOUT),
+        max_retries=GROQ_MAX_RETRIES,
+    )
+    return loop, client
+
+async def stream_model_answer(client, model: str, context, reply_tokens: int, temperature: float, chunks: queue.Queue) -> dict:
+    """Streams one model's answer into the chunk queue and measures how quickly it arrived."""
+    started = time.perf_counter()
+    first_chunk_at = None
+    completion_tokens = None
+    error = None
+    parts = []
+    try:
+        chat_completion = await client.chat.completions.create(
+            model=model,
+            messages=context,
+            max_tokens=reply_tokens,
+            temperature=temperature,
+            stream=True
+        )
+        async for chunk in chat_completion:
+            if chunk.choices and chunk.choices[0].delta.content:
+                if first_chunk_at is None:
+                    first_chunk_at = time.perf_counter()
+                parts.append(chunk.choices[0].delta.content)
+                chunks.put((model, parts[-1]))
+            if chunk.x_groq and chunk.x_groq.usage:
+                completion_tokens = chunk.x_groq.usage.completion_tokens
+    except Exception as e:
+        error = str(e)
+        parts = []
+    finished = time.perf_counter()
+    if completion_tokens is None:
+        completion_tokens = estimate_tokens("".join(parts)) if parts else 0
+    generation_seconds = finished - (first_chunk_at or started)
+    return {
+        "model": model,
+        "ttft": (first_chunk_at - started) if first_chunk_at else None,
+        "latency": finished - started,
+        "tokens": completion_tokens,
+        "tokens_per_sec": completion_tokens / generation_seconds if generation_seconds > 0 else 0.0,
+        "error": error,
+    }
+
+async def gather_model_answers(client, requests: dict, temperature: float, chunks: queue.Queue):
+    """Asks every model at once, then marks the end of the chunk queue."""
+    try:
+        return await asyncio.gather(*(
+            stream_model_answer(client, model, context, reply_tokens, temperature, chunks)
+            for model, (context, reply_tokens) in requests.items()
+        ))
+    finally:
+        chunks.put(None)
+
+def run_model_comparison(api_key: str, requests: dict, renderers: dict, temperature: float):
+    """Fans one question out to every model on the shared event loop and renders the answers.
+
+    Streamlit calls must stay on the script thread, so the loop only hands chunks back
+    through a queue and they are drawn here.
+    """
+    loop, client = get_async_groq_client(api_key)
+    chunks = queue.Queue()
+    future = asyncio.run_coroutine_threadsafe(gather_model_answers(client, requests, temperature, chunks), loop)
+    try:
+        item = chunks.get()
+        while item is not None:
+            model, text = item
+            renderers[model].write(text)
+            item = chunks.get()
+        results = future.result()
+    finally:
+        future.cancel()  # A rerun stops this script mid-stream; the calls stop with it
+    for result in results:
+        renderer = renderers[result["model"]]
+        if result["error"] is None:
+            renderer.close()
+        else:
+            renderer.placeholder.error(f"Error: {result['error']}")
+    return results
+
+def _median(values, digits: int):
+    """Rounded median of the values that were measured, or None if there are none."""
+    measured = [value for value in values if value is not None]
+    return round(statistics.median(measured), digits) if measured else None
+
+def summarize_comparisons(results):
+    """Aggregates comparison results per model, fastest median latency first."""
+    by_model = {}
+    for result in results:
+        by_model.setdefault(result["model"], []).append(result)
+    rows = []
+    for model, runs in by_model.items():
+        ok = [r for r in runs if r["error"] is None]
+        rows.append({
+            "Model": models[model]["name"],
+            "Runs": len(runs),
+            "Errors": len(runs) - len(ok),
+            "Median TTFT (s)": _median((r["ttft"] for r in ok), 3),  # None when a reply had no content
+            "Median latency (s)": _median((r["latency"] for r in ok), 3),
+            "Median tokens/s": _median((r["tokens_per_sec"] for r in ok), 1),
+            "model_id": model,
+        })
+    rows.sort(key=lambda row: (row["Median latency (s)"] is None, row["Median latency (s)"] or 0.0))
+    return rows
+
+@st.fragment
+def display_model_comparison(model_ids, max_tokens: int, temperature: float):
+    """Asks the selected models the same question and streams their answers side by side."""
+    st.markdown("### ⚖️ Model Comparison")
+    question = st.chat_input("Ask every selected model the same question...")
+    if not model_ids:
+        st.info("Choose at least one model to compare in the sidebar.")
+        return
+    if question:
+        st.markdown(f"**Question:** {question}")
+        renderers = {}
+        stats_placeholders = {}
+        for column, model in zip(st.columns(len(model_ids)), model_ids):
+            with column:
+                st.markdown(f"**🤖 {models[model]['name']}**")
+                renderers[model] = StreamRenderer(st.empty(), RENDER_FLUSH_INTERVAL, RENDER_FLUSH_CHARS)
+                stats_placeholders[model] = st.empty()
+        session_id = st.session_state.session_id
+        notes = reference_notes(question, session_id)
+        requests = {model: comparison_request(model, question, notes, max_tokens) for model in model_ids}
+        prompt_tokens = {model: sum(estimate_tokens(m["content"]) for m in context) for model, (context, _) in requests.items()}
+        admission = get_admission_controller()
+        grants = {}
+        try:
+            for model in model_ids:
+                grants[model] = admission.acquire(
+                    session_id, prompt_tokens[model] + requests[model][1],
+                    on_wait=show_queue_position(renderers[model].placeholder),
+                )
+        except AdmissionRejected:
+            for grant in grants.values():
+                admission.cancel(grant)  # None of the calls will be made
+            st.warning("Too many requests are waiting just now. Try the comparison again in a moment.")
+            return
+        results = run_model_comparison(st.secrets["GROQ_API_KEY"], requests, renderers, temperature)
+        for result in results:
+            admission.settle(grants[result["model"]], prompt_tokens[result["model"]] + result["tokens"])
+            if result["error"] is None:
+                metrics.observe("carney_compare_latency_seconds", result["latency"], result["model"], st.session_state.session_id)
+                stats_placeholders[result["model"]].caption(
+                    f"First token {result['ttft'] or 0:.2f}s · total {result['latency']:.2f}s · {result['tokens_per_sec']:.0f} tokens/s"
+                )
+        st.session_state.compare_results = (st.session_state.compare_results + results)[-COMPARE_HISTORY_LIMIT:]
+
+    if st.session_state.compare_results:
+        rows = summarize_comparisons(st.session_state.compare_results)
+        st.markdown("#### Results this session")
+        st.dataframe([{k: v for k, v in row.items() if k != "model_id"} for row in rows], hide_index=True)
+        fastest = rows[0]
+        if fastest["Median latency (s)"] is not None:
+            st.caption(
+                f"Fastest so far: {fastest['Model']}. To make it the default, set "
+                f"DEFAULT_MODEL_INDEX = {list(models.keys()).index(fastest['model_id'])} in persona.py."
+            )
+
+# --- Request Coalescing ---
+@st.cache_resource
+def get_reply_flights():
+    """Creates the process-wide registry of in-flight replies."""
+    return SingleFlight(SINGLE_FLIGHT_WORKERS)
+
 # --- Welcome Message ---
 def display_welcome_message():
     """Displays a welcome message for the chatbot."""
     if st.session_state.show_welcome:
         with st.container():
-            text_color = '#ffffff' if st.session_state.theme == 'dark' else '#000000'
-            st.markdown(
-                f"""
-                <div class='welcome-card'>
-                    <h1 style="color: {'#BA55D3' if st.session_state.theme == 'dark' else '#9370DB'};">Hey, this is {APP_NAME} 💪🏾</h1>
-                    <p style="font-size: 1.3rem; color: {text_color};">Engage in a conversation with Sergeant William Harvey Carney.</p>
-                    <p style="font-size: 1.2rem; color: {text_color};">Learn about his experiences in the Civil War and the legacy of the 54th Massachusetts.</p>
-                    <p style="font-size: 1.2rem; color: {text_color};">You can type your questions or click the microphone button to speak.</p>
-                </div>
-                """,
-                unsafe_allow_html=True
-            )
+            st.markdown(WELCOME_HTML[st.session_state.theme], unsafe_allow_html=True)
             col1, col2, col3 = st.columns([1, 1, 1])
             with col2:
                 if st.button("Start Exploring", key="dismiss_welcome"):
@@ -300,9 +1077,9 @@ icon(PAGE_ICON)
 st.markdown(f'<h2>{PAGE_TITLE}</h2>', unsafe_allow_html=True)
 st.subheader(f"{APP_NAME}: {APP_TAGLINE}")
 
-# Initialize Groq client
+# Set up the shared Groq client off the render path, while the visitor reads the page
 try:
-    client = Groq(api_key=st.secrets["GROQ_API_KEY"])
+    start_client_warmup(st.secrets["GROQ_API_KEY"])
 except KeyError:
     st.error("GROQ_API_KEY not found in secrets. Please add it to your Streamlit secrets.")
     st.stop()
@@ -310,6 +1087,12 @@ except Exception as e:
     st.error(f"Error initializing Groq client: {e}")
     st.stop()
 
+model_router = get_model_router()
+reply_flights = get_reply_flights()
+response_cache = get_response_cache() if RESPONSE_CACHE_ENABLED else None
+if response_cache and RESPONSE_CACHE_WARMUP:
+    start_cache_warmup(groq_client())
+
 # --- Sidebar ---
 with st.sidebar:
     st.markdown(f"<h2 style='color: {'#BA55D3' if st.session_state.theme == 'dark' else '#9370DB'};'>🛠️ Control Center</h2>", unsafe_allow_html=True)
@@ -322,16 +1105,32 @@ with st.sidebar:
         st.rerun()
 
     # Model selection
-    model_option = st.selectbox("AI Model", options=list(models.keys()), format_func=lambda x: f"🤖 {models[x]['name']}", index=DEFAULT_MODEL_INDEX)
+    model_option = st.selectbox("AI Model", options=list(models.keys()) + [AUTO_MODEL], format_func=lambda x: f"🤖 {model_label(x)}", index=DEFAULT_MODEL_INDEX)
     if st.session_state.selected_model != model_option:
         st.session_state.selected_model = model_option
 
     # Model info
-    model_info = models[model_option]
+    model_info = AUTO_MODEL_INFO if model_option == AUTO_MODEL else models[model_option]
     st.info(f"**Model:** {model_info['name']}  \n**Tokens:** {model_info['tokens']}  \n**By:** {model_info['developer']}  \n**Best for:** {model_info['description']}")
+    if model_option == AUTO_MODEL:
+        st.caption(f"Currently routing to {models[model_router.candidates(AUTO_MODEL, explore=False)[0]]['name']}")
+
+    # Comparison mode sends each question to several models at once
+    compare_mode = st.toggle("Compare models", value=False)
 
-    max_tokens = st.slider("Max Tokens", 512, model_info["tokens"], min(2048, model_info["tokens"]), 512)
-    temperature = st.slider("Creativity", 0.0, 1.0, 0.7, 0.1)
+    # Replies are read aloud sentence by sentence as they stream in
+    voice_replies = st.toggle("Speak replies aloud", value=False)
+    compare_models = []
+    if compare_mode:
+        compare_models = st.multiselect(
+            "Models to compare",
+            options=list(models.keys()),
+            default=list(models.keys())[:COMPARE_DEFAULT_MODELS],
+            format_func=lambda x: models[x]["name"],
+        )
+
+    max_tokens = st.slider("Max Tokens", 512, model_info["tokens"], min(DEFAULT_MAX_TOKENS, model_info["tokens"]), 512)
+    temperature = st.slider("Creativity", 0.0, 1.0, DEFAULT_TEMPERATURE, 0.1)
 
     if st.button("Reset Chat"):
         clear_chat_history()
@@ -339,13 +1138,7 @@ with st.sidebar:
 
     # Quick prompts with period-appropriate phrasing
     st.markdown(f"<h3 style='color: {'#BA55D3' if st.session_state.theme == 'dark' else '#9370DB'};'>💡 Idea Questions</h3>", unsafe_allow_html=True)
-    quick_prompts = [
-        "Pray, tell me of thy days afore the war.",
-        "What befell at the storming of Fort Wagner?",
-        "How didst thou bear the colors in battle?",
-        "What trials did the 54th Massachusetts endure?"
-    ]
-    for i, prompt in enumerate(quick_prompts):
+    for i, prompt in enumerate(QUICK_PROMPTS):
         if st.button(prompt, key=f"qp_{i}"):
             use_quick_prompt(prompt)
             st.rerun()
@@ -357,31 +1150,173 @@ with st.sidebar:
     st.markdown("[Vers3Dynamics](https://vers3dynamics.io/)")
     st.markdown("[Quantum and Wellness apps](https://woodyard.streamlit.app/)")
 
+    if response_cache:
+        cache_stats = response_cache.stats()
+        st.caption(f"Reply cache: {cache_stats['hits']} hits · {cache_stats['misses']} misses")
+
+    if METRICS_ENABLED and METRICS_DEBUG_PANEL:
+        with st.expander("📈 Performance"):
+            st.dataframe(metrics.summary(), hide_index=True)
+
 # --- Chat Interface with Image ---
-if st.session_state.show_welcome:
-    display_welcome_message()
-else:
-    # Two-column layout: Image on left, chat on right
-    col1, col2 = st.columns([1, 2])  # Adjust ratio as needed
-    with col1:
-        if os.path.exists(IMAGE_PATH):
-            st.image(IMAGE_PATH, caption=IMAGE_CAPTION, width=300)
+@st.cache_resource
+def load_portrait():
+    """Returns the portrait resized for display, as JPEG bytes, or None if the file is missing."""
+    if not os.path.exists(IMAGE_PATH):
+        return None
+    from PIL import Image
+    with Image.open(IMAGE_PATH) as image:
+        image = image.convert("RGB")
+        if image.width > IMAGE_WIDTH * 2:
+            image = image.resize((IMAGE_WIDTH * 2, round(image.height * IMAGE_WIDTH * 2 / image.width)), Image.LANCZOS)
+        buffer = BytesIO()
+        image.save(buffer, format="JPEG", quality=85, optimize=True)
+    return buffer.getvalue()
+
+def prime_stream(response_stream):
+    """Waits for a stream's first chunk, so failures surface before anything is shown."""
+    first_chunk = next(response_stream, None)
+    return itertools.chain([first_chunk], response_stream) if first_chunk is not None else iter(())
+
+def open_reply_stream(model: str, context, reply_tokens: int, temperature: float):
+    """Starts a live reply and reports how it went to the router.
+
+    The router owns retries here, so the SDK's own are turned off.
+    """
+    started = time.perf_counter()
+    try:
+        raw_response = groq_client().with_options(max_retries=0).chat.completions.with_raw_response.create(
+            model=model,
+            messages=context,
+            max_tokens=reply_tokens,
+            temperature=temperature,
+            stream=True
+        )
+        response_stream = prime_stream(generate_chat_responses(raw_response.parse()))
+    except Exception as e:
+        model_router.record_failure(model, e)
+        raise
+    model_router.record_success(model, time.perf_counter() - started, raw_response.headers)
+    return response_stream
+
+def stream_reply(placeholder, model_option: str, max_tokens: int, temperature: float, speaker=None):
+    """Streams the reply to the latest message into the placeholder, and to the speaker if given.
+
+    Tries the models the router suggests, with jittered backoff between attempts, until
+    one starts answering. Returns the reply text and the model that produced it; when
+    no model could answer, an apology is shown and returned with model_option instead.
+    """
+    from groq import APIConnectionError, APITimeoutError, AuthenticationError, PermissionDeniedError
+
+    session_id = st.session_state.session_id
+    admission = get_admission_controller()
+    messages, token_counts = request_messages()
+    notes = reference_notes(messages[-1]["content"], session_id)
+    last_error = None
+    for attempt, model in enumerate(model_router.candidates(model_option)[:ROUTER_MAX_ATTEMPTS]):
+        if attempt:
+            time.sleep(model_router.backoff(attempt))
+        context, reply_tokens = build_context(
+            messages, token_counts, models[model]["tokens"], max_tokens, notes, st.session_state.earlier_questions
+        )
+        prompt_tokens = sum(estimate_tokens(m["content"]) for m in context)
+        cache_key = response_cache_key(model, context, temperature, reply_tokens)
+        cached_chunks = response_cache.get(cache_key) if response_cache else None
+        request_started = time.perf_counter()
+        leader = False
+        grant = None
+        if cached_chunks is not None:
+            metrics.inc("carney_cache_hits_total", model=model, session=session_id)
+            response_stream = replay_cached_response(cached_chunks)
         else:
-            st.warning(f"Image not found at: {IMAGE_PATH}. Please place an image in the 'images' folder.")
-    
-    with col2:
+            metrics.inc("carney_cache_misses_total", model=model, session=session_id)
+            try:
+                # Identical requests from other sessions share one upstream stream
+                response_stream, leader = reply_flights.subscribe(cache_key)
+                if leader:
+                    # Only the call that really goes upstream waits for the shared budget
+                    try:
+                        grant = admission.acquire(
+                            session_id, prompt_tokens + reply_tokens, on_wait=show_queue_position(placeholder),
+                        )
+                    except BaseException as e:
+                        # Sessions that joined while this one waited must not wait forever
+                        reply_flights.abandon(cache_key, e if isinstance(e, AdmissionRejected) else AdmissionRejected("The request was withdrawn"))
+                        raise
+                    reply_flights.launch(cache_key, functools.partial(open_reply_stream, model, context, reply_tokens, temperature))
+                else:
+                    metrics.inc("carney_coalesced_requests_total", model=model, session=session_id)
+                response_stream = prime_stream(response_stream)
+            except AdmissionRejected:
+                metrics.inc("carney_admission_rejected_total", model=model, session=session_id)
+                st.warning("The camp is overfull with visitors just now. Pray, ask again in a moment.")
+                apology = "I crave thy pardon, friend, for many are calling upon me at once. Pray, ask again shortly."
+                placeholder.markdown(apology)
+                return apology, model_option
+            except Exception as e:
+                if grant is not None:
+                    # Only a failure to connect means the request never reached Groq
+                    unsent = isinstance(e, APIConnectionError) and not isinstance(e, APITimeoutError)
+                    admission.release(grant, 0 if unsent else prompt_tokens)
+                last_error = e
+                if isinstance(e, (AuthenticationError, PermissionDeniedError)):
+                    break  # Every model would fail the same way
+                metrics.inc("carney_chat_errors_total", model=model, session=session_id)
+                continue
+
+        # Once text is on screen the reply can no longer move to another model
+        chunks = []
+        try:
+            renderer = StreamRenderer(placeholder, RENDER_FLUSH_INTERVAL, RENDER_FLUSH_CHARS)
+            first_chunk_at = None
+            for chunk in response_stream:
+                if first_chunk_at is None:
+                    first_chunk_at = time.perf_counter()
+                chunks.append(chunk)
+                renderer.write(chunk)
+                if speaker is not None:
+                    speaker.feed(chunk)
+            full_response = renderer.close()
+        except Exception as e:
+            if grant is not None:
+                admission.release(grant, prompt_tokens + estimate_tokens("".join(chunks)))
+            model_router.record_failure(model, e)
+            metrics.inc("carney_chat_errors_total", model=model, session=session_id)
+            st.error(f"Error: {e}")
+            placeholder.markdown(REPLY_FAILED_MESSAGE)  # In place of the partial reply
+            return REPLY_FAILED_MESSAGE, model_option
+        if grant is not None:
+            admission.settle(grant, prompt_tokens + estimate_tokens(full_response))
+        if cached_chunks is None:
+            record_reply_metrics(model, session_id, request_started, first_chunk_at, full_response, renderer)
+            if response_cache and leader:
+                response_cache.set(cache_key, chunks)
+        return full_response, model
+
+    st.error(f"Error: {last_error}")
+    placeholder.markdown(REPLY_FAILED_MESSAGE)
+    return REPLY_FAILED_MESSAGE, model_option
+
+@st.fragment
+def display_chat(model_option: str, max_tokens: int, temperature: float, voice_replies: bool = False):
+    """Renders the chat column. Questions asked here rerun only this fragment, not the page."""
+    with metrics.timer("carney_chat_fragment_seconds", session=st.session_state.session_id):
+        # Older messages are read from the store only when asked for
+        earlier = earlier_message_count()
+        if earlier:
+            shown = min(earlier, st.session_state.earlier_pages * HISTORY_PAGE_SIZE)
+            if shown < earlier:
+                st.button(f"📜 Load earlier messages ({earlier - shown} more)", key="load_earlier", on_click=load_earlier_page)
+            if shown:
+                for role, content in get_conversation_store().load(st.session_state.conversation_id, earlier - shown + 1, earlier):
+                    with st.chat_message(role, avatar='🎖️' if role == "assistant" else '🙋'):
+                        st.markdown(content)
+
         # Display chat history
-        for message in st.session_state.messages[1:]:  # Skip system prompt
-            avatar = '🎖️' if message["role"] == "assistant" else '🙋'
-            with st.chat_message(message["role"], avatar=avatar):
-                st.markdown(message["content"])
-
-        # Handle user input and responses
-        def generate_chat_responses(chat_completion):
-            """Generates streaming responses from the Groq API."""
-            for chunk in chat_completion:
-                if chunk.choices[0].delta.content:
-                    yield chunk.choices[0].delta.content
+        for role, content in st.session_state.messages:
+            avatar = '🎖️' if role == "assistant" else '🙋'
+            with st.chat_message(role, avatar=avatar):
+                st.markdown(content)
 
         # Add voice input option
         st.write("Ask your question:")
@@ -393,41 +1328,58 @@ else:
         with col2:
             # Add audio recording capability
             audio_data = audio_recorder()
-            if audio_data:
+            audio_hash = hashlib.sha256(audio_data).hexdigest() if audio_data else None
+            # The widget keeps returning the last recording, so only handle a new one
+            if audio_hash and audio_hash != st.session_state.last_audio_hash:
+                st.session_state.last_audio_hash = audio_hash
                 # Process the audio and get transcription
                 with st.spinner("Transcribing your speech..."):
-                    transcription = process_audio(audio_data)
+                    transcription = process_audio(audio_data, audio_hash)
                     if transcription:
-                        st.session_state.audio_data = None
                         user_input = transcription
                         st.success(f"You said: {transcription}")
         
+        # A quick prompt clicked in the sidebar is answered like a typed question
+        if not user_input and st.session_state.pending_prompt:
+            user_input = st.session_state.pending_prompt
+            st.session_state.pending_prompt = None
+
         if user_input:
             st.session_state.chat_counter += 1
-            st.session_state.messages.append({"role": "user", "content": user_input})
+            add_message("user", user_input)
             with st.chat_message("user", avatar='🙋'):
                 st.markdown(user_input)
             with st.chat_message("assistant", avatar="🎖️"):
                 placeholder = st.empty()
-                full_response = ""
                 loading_message = random.choice(LOADING_MESSAGES)
                 placeholder.markdown(f"<div class='progress-message'>{loading_message}</div>", unsafe_allow_html=True)
-                try:
-                    chat_completion = client.chat.completions.create(
-                        model=model_option,
-                        messages=st.session_state.messages,
-                        max_tokens=max_tokens,
-                        temperature=temperature,
-                        stream=True
-                    )
-                    for chunk in generate_chat_responses(chat_completion):
-                        full_response += chunk
-                        placeholder.markdown(full_response + "▌")
-                    placeholder.markdown(full_response)
-                except Exception as e:
-                    st.error(f"Error: {e}")
-                    full_response = "I crave thy pardon haha, for I cannot speak now. Pray, try once more friend."
-                st.session_state.messages.append({"role": "assistant", "content": full_response})
+                speaker = None
+                if voice_replies:
+                    speaker = VoiceReply(get_speech_synthesizer(groq_client()), st.container(), st.session_state.session_id)
+                full_response, answered_by = stream_reply(placeholder, model_option, max_tokens, temperature, speaker)
+                if answered_by != model_option:
+                    st.caption(f"Answered by {models[answered_by]['name']}")
+                # Saved before waiting on speech, so a rerun during playback keeps the reply
+                add_message("assistant", full_response)
+                if speaker is not None:
+                    speaker.finish()
+
+if st.session_state.show_welcome:
+    display_welcome_message()
+elif compare_mode:
+    display_model_comparison(compare_models, max_tokens, temperature)
+else:
+    # Two-column layout: Image on left, chat on right
+    col1, col2 = st.columns([1, 2])  # Adjust ratio as needed
+    with col1:
+        portrait = load_portrait()
+        if portrait is not None:
+            st.image(portrait, caption=IMAGE_CAPTION, width=IMAGE_WIDTH)
+        else:
+            st.warning(f"Image not found at: {IMAGE_PATH}. Please place an image in the 'images' folder.")
+    
+    with col2:
+        display_chat(model_option, max_tokens, temperature, voice_replies)
 
 # --- Footer ---
 st.markdown(
@@ -438,3 +1390,6 @@ st.markdown(
     """,
     unsafe_allow_html=True
 )
+
+# Reruns cut short by st.rerun() or st.stop() are not recorded
+metrics.observe("carney_rerun_seconds", time.perf_counter() - rerun_started, session=st.session_state.session_id)
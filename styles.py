@@ -0,0 +1,63 @@
+"""Page styling and fixed page markup for the light and dark themes.
+
+Built once on import and shared by every session, rather than rebuilt on each rerun.
+"""
+from persona import APP_NAME
+
+# --- CSS Styling for Historical Theme ---
+THEME_CSS = {
+    "dark": """
+        <style>
+            .stApp { background-color: #2c2f33; color: #ffffff !important; }
+            .stChatMessage { border-radius: 15px; padding: 1.5rem; margin: 1rem 0; box-shadow: 0 4px 12px rgba(0, 0, 0, 0.4); }
+            .stChatMessage.user { background: linear-gradient(135deg, #4B0082 0%, #8A2BE2 100%); margin-left: 15%; }
+            .stChatMessage.assistant { background: linear-gradient(135deg, #16213e 0%, #2d2d3a 100%); margin-right: 15%; border: 2px solid #4B0082; }
+            .stChatMessage * { color: #ffffff !important; }
+            div.stButton > button { background: linear-gradient(45deg, #4B0082, #8A2BE2); color: white !important; border-radius: 30px; padding: 1rem 2rem; font-size: 18px !important; border: none; }
+            .progress-message { color: #BA55D3; font-size: 18px !important; }
+            .welcome-card { padding: 2rem; background: linear-gradient(135deg, #2c2f33 0%, #16213e 100%); border-radius: 20px; box-shadow: 0 6px 12px rgba(0, 0, 0, 0.5); border: 2px solid #4B0082; }
+            .record-button { background: linear-gradient(45deg, #B22222, #FF0000) !important; }
+            .record-button:hover { background: linear-gradient(45deg, #FF0000, #B22222) !important; }
+            .recording { animation: pulse 1.5s infinite; }
+            @keyframes pulse {
+                0% { opacity: 1; }
+                50% { opacity: 0.5; }
+                100% { opacity: 1; }
+            }
+        </style>
+        """,
+    "light": """
+        <style>
+            .stApp { background-color: #f5f5dc; color: #000000 !important; }  /* Beige background for vintage feel */
+            .stChatMessage { border-radius: 15px; padding: 1.5rem; margin: 1rem 0; box-shadow: 0 4px 12px rgba(0, 0, 0, 0.15); }
+            .stChatMessage.user { background: linear-gradient(135deg, #E6E6FA 0%, #D8BFD8 100%); margin-left: 15%; }
+            .stChatMessage.assistant { background: linear-gradient(135deg, #F0F8FF 0%, #E6E6FA 100%); margin-right: 15%; border: 2px solid #D8BFD8; }
+            .stChatMessage * { color: #000000 !important; }
+            div.stButton > button { background: linear-gradient(45deg, #9370DB, #DA70D6); color: black !important; border-radius: 30px; padding: 1rem 2rem; font-size: 18px !important; border: none; }
+            .progress-message { color: #9370DB; font-size: 18px !important; }
+            .welcome-card { padding: 2rem; background: linear-gradient(135deg, #f5f5dc 0%, #e4e8ed 100%); border-radius: 20px; box-shadow: 0 6px 12px rgba(0, 0, 0, 0.15); border: 2px solid #D8BFD8; }
+            .record-button { background: linear-gradient(45deg, #8B0000, #CD5C5C) !important; }
+            .record-button:hover { background: linear-gradient(45deg, #CD5C5C, #8B0000) !important; }
+            .recording { animation: pulse 1.5s infinite; }
+            @keyframes pulse {
+                0% { opacity: 1; }
+                50% { opacity: 0.5; }
+                100% { opacity: 1; }
+            }
+        </style>
+        """,
+}
+
+# --- Welcome Message ---
+def _welcome_html(theme: str) -> str:
+    text_color = '#ffffff' if theme == 'dark' else '#000000'
+    return f"""
+                <div class='welcome-card'>
+                    <h1 style="color: {'#BA55D3' if theme == 'dark' else '#9370DB'};">Hey, this is {APP_NAME} 💪🏾</h1>
+                    <p style="font-size: 1.3rem; color: {text_color};">Engage in a conversation with Sergeant William Harvey Carney.</p>
+                    <p style="font-size: 1.2rem; color: {text_color};">Learn about his experiences in the Civil War and the legacy of the 54th Massachusetts.</p>
+                    <p style="font-size: 1.2rem; color: {text_color};">You can type your questions or click the microphone button to speak.</p>
+                </div>
+                """
+
+WELCOME_HTML = {theme: _welcome_html(theme) for theme in THEME_CSS}
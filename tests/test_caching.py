@@ -0,0 +1,91 @@
+import os
+import time
+
+from caching import DiskCache, LRUCache, ResponseCache, replay_cached_response, response_cache_key
+
+
+def age(path, seconds):
+    """Backdates a file as if it had been written seconds ago."""
+    then = time.time() - seconds
+    os.utime(path, (then, then))
+
+
+def test_lru_expires_entries_after_ttl():
+    cache = LRUCache(max_entries=4, ttl=100)
+    cache.set("fresh", 1)
+    cache.set("stale", 2, stored_at=time.time() - 101)
+    assert cache.get("fresh") == 1
+    assert cache.get("stale") is None
+    assert len(cache) == 1
+
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUCache(max_entries=2, ttl=100)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")  # b is now the oldest
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+
+
+def test_disk_cache_expires_by_file_age(tmp_path):
+    cache = DiskCache(str(tmp_path), ttl=100, max_bytes=10_000)
+    cache.set("key", ["Hark"])
+    assert cache.get("key") == ["Hark"]
+    age(tmp_path / "key.json", 101)
+    assert cache.get("key") is None
+    assert not (tmp_path / "key.json").exists()
+
+
+def test_disk_cache_evicts_oldest_over_size_cap(tmp_path):
+    chunks = ["x" * 100]
+    entry_size = len('["' + "x" * 100 + '"]')
+    cache = DiskCache(str(tmp_path), ttl=1000, max_bytes=entry_size * 2)
+    for i, key in enumerate(["old", "middle"]):
+        cache.set(key, chunks)
+        age(tmp_path / f"{key}.json", 10 - i)
+    cache.set("new", chunks)
+    assert sorted(os.listdir(tmp_path)) == ["middle.json", "new.json"]
+    # A reopened cache counts what is already on disk
+    assert DiskCache(str(tmp_path), ttl=1000, max_bytes=entry_size * 2)._size == entry_size * 2
+
+
+def test_response_cache_counts_hits_and_misses(tmp_path):
+    cache = ResponseCache(str(tmp_path), ttl=100, max_entries=4, max_bytes=10_000)
+    assert cache.get("key") is None
+    cache.set("key", ["Aye, ", "friend."])
+    assert cache.get("key") == ["Aye, ", "friend."]
+    assert cache.get("key") == ["Aye, ", "friend."]
+    assert cache.stats() == {"hits": 2, "misses": 1, "hit_rate": 2 / 3, "memory_entries": 1}
+
+
+def test_promotion_from_disk_keeps_entry_age(tmp_path):
+    writer = ResponseCache(str(tmp_path), ttl=100, max_entries=4, max_bytes=10_000)
+    writer.set("key", ["Aye."])
+    age(tmp_path / "key.json", 90)
+
+    # Another process, or a restart, finds the entry only on disk
+    reader = ResponseCache(str(tmp_path), ttl=100, max_entries=4, max_bytes=10_000)
+    assert reader.get("key") == ["Aye."]
+    stored_at, _ = reader.memory._entries["key"]
+    assert time.time() - stored_at >= 90  # Not renewed by the promotion
+
+
+def test_cache_key_covers_everything_that_shapes_a_reply():
+    messages = [{"role": "system", "content": "Thou art Carney."}, {"role": "user", "content": "Who art thou?"}]
+    key = response_cache_key("model-a", messages, 0.7, 1024)
+    assert key == response_cache_key("model-a", [dict(m) for m in messages], 0.7, 1024)
+    assert key != response_cache_key("model-b", messages, 0.7, 1024)
+    assert key != response_cache_key("model-a", messages, 0.2, 1024)
+    assert key != response_cache_key("model-a", messages, 0.7, 512)
+    assert key != response_cache_key("model-a", [messages[0], {"role": "user", "content": "Who?"}], 0.7, 1024)
+    changed_system = [{"role": "system", "content": "Thou art Douglass."}, messages[1]]
+    assert key != response_cache_key("model-a", changed_system, 0.7, 1024)
+
+
+def test_replay_yields_every_chunk_quickly():
+    chunks = [f"{i} " for i in range(500)]
+    started = time.perf_counter()
+    assert list(replay_cached_response(chunks)) == chunks
+    assert time.perf_counter() - started < 3
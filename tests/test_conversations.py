@@ -0,0 +1,49 @@
+import threading
+
+from conversations import ConversationStore
+
+
+def test_messages_are_numbered_and_paged(tmp_path):
+    store = ConversationStore(str(tmp_path / "conversations.db"))
+    for i in range(5):
+        store.append("a", "user", f"Question {i}?")
+        store.append("a", "assistant", f"Answer {i}.")
+    store.append("b", "user", "Another visitor?")
+
+    assert store.count("a") == 10
+    assert store.count("b") == 1
+    assert store.count("missing") == 0
+    assert store.load("a", 9, 10) == [("user", "Question 4?"), ("assistant", "Answer 4.")]
+    assert store.load("a", 1, 2) == [("user", "Question 0?"), ("assistant", "Answer 0.")]
+
+
+def test_recalled_questions_are_the_latest_before_the_window(tmp_path):
+    store = ConversationStore(str(tmp_path / "conversations.db"))
+    for i in range(30):
+        store.append("a", "user", f"Q{i}")
+        store.append("a", "assistant", f"A{i}")
+    # Messages up to seq 40 hold questions Q0..Q19
+    assert store.questions("a", 40, limit=3) == ["Q17", "Q18", "Q19"]
+
+
+def test_store_survives_reopening(tmp_path):
+    path = str(tmp_path / "nested" / "conversations.db")
+    ConversationStore(path).append("a", "user", "Who art thou?")
+    assert ConversationStore(path).load("a", 1, 1) == [("user", "Who art thou?")]
+
+
+def test_concurrent_sessions_never_share_a_sequence_number(tmp_path):
+    store = ConversationStore(str(tmp_path / "conversations.db"))
+
+    def talk(conversation_id):
+        for i in range(25):
+            store.append(conversation_id, "user", f"{conversation_id} {i}")
+
+    threads = [threading.Thread(target=talk, args=(name,)) for name in ("a", "a", "b")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert store.count("a") == 50
+    assert len(store.load("a", 1, 50)) == 50
+    assert store.count("b") == 25
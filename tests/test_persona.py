@@ -0,0 +1,70 @@
+import random
+
+import pytest
+
+from persona import (
+    CONTEXT_SAFETY_MARGIN, SUMMARY_MAX_CHARS, SYSTEM_MESSAGE, SYSTEM_PROMPT_TOKENS, build_context, estimate_tokens,
+    models, recall_questions,
+)
+
+
+def conversation(rng, turns):
+    messages = [SYSTEM_MESSAGE]
+    for turn in range(turns):
+        role = "user" if turn % 2 == 0 else "assistant"
+        length = rng.randint(20, 300) if role == "user" else rng.randint(200, 6000)
+        messages.append({"role": role, "content": " ".join(["word"] * (length // 5))})
+    if messages[-1]["role"] != "user":
+        messages.append({"role": "user", "content": "What befell at Fort Wagner?"})
+    return messages
+
+
+@pytest.mark.parametrize("model", sorted(models))
+@pytest.mark.parametrize("max_tokens", [256, 2048, 8192])
+def test_context_fits_model_limit(model, max_tokens):
+    rng = random.Random(f"{model}-{max_tokens}")
+    limit = models[model]["tokens"]
+    for _ in range(50):
+        messages = conversation(rng, rng.randint(0, 80))
+        token_counts = [SYSTEM_PROMPT_TOKENS] + [estimate_tokens(m["content"]) for m in messages[1:]]
+        notes = "Reference notes\n\n" + "passage " * rng.randint(0, 200)
+        earlier = "Who art thou? " * rng.randint(0, 60)
+        context, reply_tokens = build_context(messages, token_counts, limit, max_tokens, notes, earlier)
+
+        prompt_tokens = sum(estimate_tokens(m["content"]) for m in context)
+        assert prompt_tokens + reply_tokens <= limit - CONTEXT_SAFETY_MARGIN
+        assert 0 < reply_tokens <= max_tokens
+        assert context[0] == SYSTEM_MESSAGE
+        assert context[-1] == messages[-1]
+
+
+def test_dropped_turns_leave_a_note():
+    messages = [SYSTEM_MESSAGE]
+    for i in range(40):
+        messages.append({"role": "user", "content": f"Question {i}?"})
+        messages.append({"role": "assistant", "content": "answer " * 400})
+    token_counts = [estimate_tokens(m["content"]) for m in messages]
+    context, _ = build_context(messages, token_counts, 4096, 1024)
+    assert len(context) < len(messages)
+    assert context[1]["role"] == "system"
+    assert context[1]["content"].startswith("Earlier in this conversation the visitor asked:")
+    assert "Question 0?" not in [m["content"] for m in context]
+    assert context[2]["role"] == "user"
+
+
+def test_questions_trimmed_by_the_caller_are_still_recalled():
+    messages = [SYSTEM_MESSAGE, {"role": "user", "content": "And after the war?"}]
+    token_counts = [estimate_tokens(m["content"]) for m in messages]
+    context, _ = build_context(messages, token_counts, 8192, 1024, earlier="Where wast thou born?")
+    assert context == [
+        SYSTEM_MESSAGE,
+        {"role": "system", "content": "Earlier in this conversation the visitor asked: Where wast thou born?"},
+        messages[1],
+    ]
+
+
+def test_recalled_questions_keep_the_most_recent():
+    recalled = recall_questions([f"Question {i}?" for i in range(100)])
+    assert len(recalled) == SUMMARY_MAX_CHARS + 3
+    assert recalled.startswith("...") and recalled.endswith("Question 99?")
+    assert recall_questions(["  Next?  "], recalled).endswith("Question 99?; Next?")
@@ -0,0 +1,43 @@
+from rendering import STREAM_CURSOR, StreamRenderer
+
+
+class Placeholder:
+    def __init__(self):
+        self.drawn = []
+
+    def markdown(self, text):
+        self.drawn.append(text)
+
+
+def test_first_chunk_shows_at_once_and_the_rest_is_batched():
+    placeholder = Placeholder()
+    renderer = StreamRenderer(placeholder, interval=60, flush_chars=1000)
+    renderer.write("Hark")
+    for word in [", friend", ". The", " colors"]:
+        renderer.write(word)
+    assert placeholder.drawn == ["Hark" + STREAM_CURSOR]
+
+    assert renderer.close() == "Hark, friend. The colors"
+    assert placeholder.drawn[-1] == "Hark, friend. The colors"
+    assert renderer.flushes == 2
+
+
+def test_enough_new_text_forces_a_redraw():
+    placeholder = Placeholder()
+    renderer = StreamRenderer(placeholder, interval=60, flush_chars=10)
+    renderer.write("a")
+    renderer.write("b" * 5)
+    renderer.write("c" * 5)
+    assert placeholder.drawn == ["a" + STREAM_CURSOR, "abbbbbccccc" + STREAM_CURSOR]
+
+
+def test_zero_limits_redraw_every_chunk():
+    placeholder = Placeholder()
+    renderer = StreamRenderer(placeholder, interval=0, flush_chars=0)
+    for chunk in ["Aye", ", ", "friend."]:
+        renderer.write(chunk)
+    renderer.close()
+    assert placeholder.drawn == ["Aye" + STREAM_CURSOR, "Aye, " + STREAM_CURSOR, "Aye, friend." + STREAM_CURSOR, "Aye, friend."]
+    stats = renderer.stats()
+    assert stats["flushes"] == 4
+    assert stats["chars_sent"] == sum(len(text) for text in placeholder.drawn)
@@ -0,0 +1,72 @@
+from persona import RETRIEVAL_MIN_SCORE, RETRIEVAL_NOTES_HEADER, RETRIEVAL_TOKEN_BUDGET, format_reference_notes
+from retrieval import Passage, RetrievalIndex, build_index, load_index
+
+WAGNER = """# Fort Wagner
+
+Carney carried the flag up the parapet at Fort Wagner and was wounded twice.
+
+The regiment fell back under heavy fire from the fort."""
+
+BEDFORD = """# New Bedford
+
+Carney settled in New Bedford and worked as a mail carrier for many years.
+
+He was awarded the Medal of Honor in 1900."""
+
+
+def corpus(tmp_path, **files):
+    directory = tmp_path / "corpus"
+    directory.mkdir(exist_ok=True)
+    for name, text in files.items():
+        (directory / f"{name}.md").write_text(text, encoding="utf-8")
+    return str(directory)
+
+
+def test_search_ranks_passages_by_bm25(tmp_path):
+    corpus_dir = corpus(tmp_path, wagner=WAGNER, bedford=BEDFORD)
+    index_dir = str(tmp_path / "index")
+    build_index(corpus_dir, index_dir)
+    index = RetrievalIndex(index_dir)
+    results = index.search("How was Carney wounded at Fort Wagner?")
+    assert results[0].source == "Fort Wagner"
+    assert "wounded twice" in results[0].text
+    assert [p.score for p in results] == sorted((p.score for p in results), reverse=True)
+    assert index.search("mail carrier")[0].source == "New Bedford"
+    assert index.search("zeppelin") == []
+
+
+def test_notes_drop_weak_matches():
+    strong = Passage("Fort Wagner", "Carney carried the flag.", RETRIEVAL_MIN_SCORE + 1)
+    weak = Passage("New Bedford", "He carried the mail.", RETRIEVAL_MIN_SCORE - 0.1)
+    notes = format_reference_notes([strong, weak])
+    assert notes.startswith(RETRIEVAL_NOTES_HEADER)
+    assert "[Fort Wagner] Carney carried the flag." in notes
+    assert "mail" not in notes
+    assert format_reference_notes([weak]) == ""
+
+
+def test_notes_skip_passages_over_the_token_budget():
+    long = Passage("Long", "word " * (RETRIEVAL_TOKEN_BUDGET * 4), RETRIEVAL_MIN_SCORE + 2)
+    short = Passage("Short", "Carney carried the flag.", RETRIEVAL_MIN_SCORE + 1)
+    notes = format_reference_notes([long, short])
+    assert "[Long]" not in notes
+    assert "[Short] Carney carried the flag." in notes
+
+
+def test_load_index_rebuilds_when_corpus_changes(tmp_path):
+    corpus_dir = corpus(tmp_path, wagner=WAGNER)
+    index_dir = str(tmp_path / "index")
+    first = load_index(corpus_dir, index_dir)
+    assert first.search("mail carrier") == []
+
+    corpus(tmp_path, bedford=BEDFORD)
+    second = load_index(corpus_dir, index_dir)
+    assert second.digest != first.digest
+    assert second.search("mail carrier")[0].source == "New Bedford"
+    assert load_index(corpus_dir, index_dir).digest == second.digest
+
+
+def test_load_index_without_corpus(tmp_path):
+    assert load_index(str(tmp_path / "missing"), str(tmp_path / "index")) is None
+    assert load_index(corpus(tmp_path), str(tmp_path / "index")) is None
+    assert not (tmp_path / "index").exists()
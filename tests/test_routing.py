@@ -0,0 +1,114 @@
+import groq
+import httpx
+import pytest
+
+from routing import (
+    AUTO_MODEL, ROUTER_BACKOFF_MAX, ROUTER_MAX_FIRST_CHUNK_SECONDS, ROUTER_MIN_SAMPLES, ROUTER_PRIOR_FIRST_CHUNK_SECONDS,
+    ModelRouter, _parse_reset, is_transient,
+)
+
+MODELS = ["big", "small", "tiny"]
+REQUEST = httpx.Request("POST", "https://api.groq.com/openai/v1/chat/completions")
+
+
+def status_error(status: int, headers=None):
+    response = httpx.Response(status, headers=headers or {}, request=REQUEST)
+    return groq.APIStatusError(f"HTTP {status}", response=response, body=None)
+
+
+@pytest.mark.parametrize("value, seconds", [("7.66s", 7.66), ("2m59.56s", 179.56), ("120ms", 0.12), ("1h", 3600)])
+def test_parse_reset(value, seconds):
+    assert _parse_reset(value) == pytest.approx(seconds)
+    assert _parse_reset("") is None
+
+
+def test_selected_model_goes_first_then_fallbacks():
+    router = ModelRouter(MODELS, ["tiny", "small"])
+    assert router.candidates("big") == ["big", "tiny", "small"]
+    assert router.candidates("small") == ["small", "tiny"]
+
+
+def test_rate_limit_cools_a_model_down():
+    router = ModelRouter(MODELS, ["tiny", "small"])
+    router.record_failure("big", status_error(429, {"retry-after": "30"}))
+    assert not router.is_healthy("big")
+    assert router.candidates("big") == ["tiny", "small", "big"]
+
+
+def test_exhausted_quota_headers_cool_a_model_down():
+    router = ModelRouter(MODELS, ["tiny"])
+    headers = {"x-ratelimit-remaining-tokens": "0", "x-ratelimit-reset-tokens": "1m"}
+    router.record_success("big", 0.2, headers)
+    assert not router.is_healthy("big")
+
+
+def test_mostly_failing_model_is_degraded():
+    router = ModelRouter(MODELS, ["tiny"])
+    for _ in range(ROUTER_MIN_SAMPLES):
+        router.record_failure("small", status_error(503))
+    assert not router.is_healthy("small")
+    assert router.is_healthy("tiny")
+
+
+def test_slow_first_chunks_degrade_a_model():
+    router = ModelRouter(MODELS, ["tiny"])
+    for _ in range(10):
+        router.record_success("big", ROUTER_MAX_FIRST_CHUNK_SECONDS * 2)
+    assert not router.is_healthy("big")
+
+
+def test_auto_prefers_the_fastest_measured_model():
+    router = ModelRouter(MODELS, ["tiny", "small"], explore_rate=0)
+    router.record_success("big", 0.2)
+    router.record_success("small", 0.9)
+    router.record_success("tiny", 0.5)
+    assert router.candidates(AUTO_MODEL) == ["big", "tiny", "small"]
+
+
+def test_auto_tries_unmeasured_models_before_slow_ones():
+    router = ModelRouter(MODELS, ["tiny", "small"], explore_rate=0)
+    router.record_success("small", ROUTER_PRIOR_FIRST_CHUNK_SECONDS * 3)
+    # Not "the first model anyone used": untried models get their turn ahead of a slow one
+    assert router.candidates(AUTO_MODEL) == ["tiny", "big", "small"]
+    router.record_success("tiny", ROUTER_PRIOR_FIRST_CHUNK_SECONDS / 4)
+    assert router.candidates(AUTO_MODEL)[0] == "tiny"
+
+
+def test_auto_sometimes_leads_with_another_model():
+    router = ModelRouter(MODELS, ["tiny", "small"], explore_rate=1)
+    for model, seconds in [("big", 0.2), ("small", 0.9), ("tiny", 0.5)]:
+        router.record_success(model, seconds)
+    leaders = {router.candidates(AUTO_MODEL)[0] for _ in range(50)}
+    assert leaders == {"small", "tiny"}
+    assert sorted(router.candidates(AUTO_MODEL)) == sorted(MODELS)
+    assert router.candidates(AUTO_MODEL, explore=False)[0] == "big"
+
+
+@pytest.mark.parametrize("error, transient", [
+    (status_error(429), True),
+    (status_error(500), True),
+    (status_error(503), True),
+    (groq.APITimeoutError(request=REQUEST), True),
+    (groq.APIConnectionError(request=REQUEST), True),
+    (httpx.ReadTimeout("read timed out"), True),
+    (status_error(400), False),
+    (status_error(413), False),
+    (status_error(404), False),
+    (ValueError("bad chunk"), False),
+])
+def test_only_transient_failures_count(error, transient):
+    assert is_transient(error) is transient
+
+
+def test_bad_requests_do_not_degrade_a_model():
+    router = ModelRouter(MODELS, ["tiny"])
+    for _ in range(ROUTER_MIN_SAMPLES * 3):
+        router.record_failure("big", status_error(400))  # An oversized question, say
+    assert router.is_healthy("big")
+
+
+def test_backoff_grows_with_jitter_up_to_a_cap():
+    router = ModelRouter(MODELS, ["tiny"])
+    assert 0.25 <= router.backoff(1) <= 0.75
+    assert all(router.backoff(attempt) <= ROUTER_BACKOFF_MAX * 1.5 for attempt in range(1, 20))
+
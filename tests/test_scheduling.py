@@ -0,0 +1,185 @@
+import queue
+import threading
+import time
+
+import pytest
+
+from scheduling import AdmissionController, AdmissionRejected, SingleFlight
+
+
+def wait_until(predicate, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+class Waiter:
+    """Calls acquire on a thread and records the positions it is shown."""
+
+    def __init__(self, controller, session, tokens=0):
+        self.positions = []
+        self.grant = None
+        self.error = None
+        self.thread = threading.Thread(target=self._run, args=(controller, session, tokens), daemon=True)
+        self.thread.start()
+
+    def _run(self, controller, session, tokens):
+        try:
+            self.grant = controller.acquire(session, tokens, on_wait=self.positions.append, timeout=10)
+        except AdmissionRejected as e:
+            self.error = e
+
+    @property
+    def position(self):
+        return self.positions[-1] if self.positions else None
+
+
+def test_waiting_sessions_take_turns():
+    controller = AdmissionController(requests_per_minute=1, tokens_per_minute=1000, queue_limit=10)
+    blocker = controller.acquire("kiosk", 0)
+
+    first_a = Waiter(controller, "a")
+    wait_until(lambda: first_a.position == 1)
+    second_a = Waiter(controller, "a")
+    wait_until(lambda: second_a.position == 2)
+    first_b = Waiter(controller, "b")
+    # b's first request goes ahead of a's second
+    wait_until(lambda: first_b.position == 2 and second_a.position == 3)
+
+    admitted = []
+    for waiter in (first_a, first_b, second_a):
+        controller.cancel(blocker)
+        waiter.thread.join(5)
+        assert waiter.grant is not None
+        admitted.append(waiter)
+        blocker = waiter.grant
+    assert admitted == [first_a, first_b, second_a]
+
+
+def test_full_queue_rejects_at_once():
+    controller = AdmissionController(requests_per_minute=1, tokens_per_minute=1000, queue_limit=1)
+    blocker = controller.acquire("kiosk", 0)
+    waiter = Waiter(controller, "a")
+    wait_until(lambda: waiter.position == 1)
+
+    started = time.monotonic()
+    with pytest.raises(AdmissionRejected):
+        controller.acquire("b", 0)
+    assert time.monotonic() - started < 0.5
+
+    controller.cancel(blocker)
+    waiter.thread.join(5)
+    assert waiter.grant is not None
+
+
+def test_wait_times_out():
+    controller = AdmissionController(requests_per_minute=10, tokens_per_minute=100, queue_limit=10)
+    controller.acquire("kiosk", 100)
+    with pytest.raises(AdmissionRejected):
+        controller.acquire("a", 50, timeout=0.1)
+    # The timed-out request left the queue
+    assert controller.acquire("a", 0, timeout=0.1) is not None
+
+
+def test_settle_frees_unused_tokens():
+    controller = AdmissionController(requests_per_minute=10, tokens_per_minute=100, queue_limit=10)
+    grant = controller.acquire("a", 100)
+    controller.settle(grant, 40)
+    assert controller.acquire("b", 60, timeout=0.1) is not None
+
+
+def feed(chunks: queue.Queue):
+    """Returns a start function that streams whatever the test puts on the queue."""
+    def start():
+        while True:
+            chunk = chunks.get(timeout=5)
+            if chunk is None:
+                return
+            if isinstance(chunk, Exception):
+                raise chunk
+            yield chunk
+    return start
+
+
+def test_late_subscriber_replays_then_follows():
+    flights = SingleFlight(max_workers=2)
+    chunks = queue.Queue()
+    calls = []
+
+    def start():
+        calls.append(1)
+        return feed(chunks)()
+
+    early, leader = flights.subscribe("key")
+    assert leader
+    flights.launch("key", start)
+    chunks.put("Hark, ")
+    chunks.put("friend. ")
+    assert [next(early), next(early)] == ["Hark, ", "friend. "]
+
+    late, late_leader = flights.subscribe("key")
+    assert not late_leader
+    chunks.put("The colors never touched the ground.")
+    chunks.put(None)
+
+    assert list(late) == ["Hark, ", "friend. ", "The colors never touched the ground."]
+    assert list(early) == ["The colors never touched the ground."]
+    assert calls == [1]
+    assert not flights.in_flight("key")
+
+
+def test_error_before_first_chunk_reaches_every_subscriber():
+    flights = SingleFlight(max_workers=2)
+    chunks = queue.Queue()
+    first, _ = flights.subscribe("key")
+    flights.launch("key", feed(chunks))
+    second, leader = flights.subscribe("key")
+    assert not leader
+
+    chunks.put(ConnectionError("upstream closed"))
+    for subscriber in (first, second):
+        with pytest.raises(ConnectionError):
+            next(subscriber)
+    assert not flights.in_flight("key")
+
+
+def test_followers_wait_for_the_leader_to_launch():
+    flights = SingleFlight(max_workers=2)
+    leader_stream, leader = flights.subscribe("key")
+    # Joining while the leader is still waiting for admission does not start a second call
+    follower_stream, follower_leads = flights.subscribe("key")
+    assert leader and not follower_leads
+
+    chunks = queue.Queue()
+    chunks.put("Aye.")
+    chunks.put(None)
+    flights.launch("key", feed(chunks))
+    assert list(follower_stream) == ["Aye."]
+    assert list(leader_stream) == ["Aye."]
+
+
+def test_abandoned_request_fails_its_followers():
+    flights = SingleFlight(max_workers=2)
+    flights.subscribe("key")
+    follower_stream, _ = flights.subscribe("key")
+    flights.abandon("key", AdmissionRejected("The queue is full"))
+    with pytest.raises(AdmissionRejected):
+        next(follower_stream)
+    # The next identical request starts afresh
+    assert flights.subscribe("key")[1]
+
+
+def test_failed_attempts_release_their_reply_budget():
+    controller = AdmissionController(requests_per_minute=30, tokens_per_minute=30000, queue_limit=10)
+    # A 429 storm: every attempt reaches Groq with its prompt and fails before replying
+    for _ in range(20):
+        grant = controller.acquire("a", 600 + 2048, timeout=0.1)
+        controller.release(grant, 600)
+    assert controller.acquire("b", 600 + 2048, timeout=0.1) is not None
+
+
+def test_release_without_tokens_returns_the_request():
+    controller = AdmissionController(requests_per_minute=1, tokens_per_minute=30000, queue_limit=10)
+    controller.release(controller.acquire("a", 2648), 0)  # Could not connect
+    assert controller.acquire("b", 2648, timeout=0.1) is not None
@@ -0,0 +1,26 @@
+from speech import SentenceSplitter, speakable
+
+
+def test_sentences_come_out_as_soon_as_they_end():
+    splitter = SentenceSplitter(min_chars=10)
+    assert splitter.feed("I was born in Norfolk, Vir") == []
+    assert splitter.feed("ginia. Later I went north") == ["I was born in Norfolk, Virginia."]
+    assert splitter.feed(" to New Bedford! And") == ["Later I went north to New Bedford!"]
+    assert splitter.flush() == ["And"]
+    assert splitter.flush() == []
+
+
+def test_short_fragments_join_the_next_sentence():
+    splitter = SentenceSplitter(min_chars=24)
+    assert splitter.feed("Aye. I carried the colors that night. ") == ["Aye. I carried the colors that night."]
+
+
+def test_closing_quotes_stay_with_their_sentence():
+    splitter = SentenceSplitter(min_chars=10)
+    sentences = splitter.feed('I said, "Boys, I only did my duty." Then I fell. ')
+    assert sentences == ['I said, "Boys, I only did my duty."', "Then I fell."]
+
+
+def test_markdown_is_not_read_aloud():
+    assert speakable("**The 54th** _Massachusetts_ `#1`") == "The 54th Massachusetts 1"
+    assert speakable("> ***") == ""